@@ -1,3 +1,9 @@
 __version__ = "0.1.0"
 
-from . import ui
+
+def __getattr__(name):
+    # The GUI and its Qt stack are only imported on first use, so that CLI jobs start fast
+    if name == 'ui':
+        import importlib
+        return importlib.import_module('.ui', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,10 +3,7 @@ import logging
 import os
 from pathlib import Path
 
-from PyQt5.QtWidgets import QApplication
-from bbo import label_lib
-
-from . import ui
+from . import label_io, perf, trace
 
 logger = logging.getLogger(__name__)
 
@@ -26,21 +23,35 @@ def main():
                         help="Switches between master mode and worker mode")
     parser.add_argument('--sync', type=str, required=False, nargs='*', default=["bbo/sync/t"],
                         help="Sync via mqtt. Defaults to channel bbo/sync/t")
+    parser.add_argument('--profile', type=str, required=False, nargs='?', default=None, const='',
+                        help="Measure the latencies of rendering, labeling and saving. Shown in View > Performance "
+                             "and written as JSON on exit to the given file, if any.")
+    parser.add_argument('--trace', type=str, required=False, default=None,
+                        help="Enable diagnostic tracing of subsystems as SUBSYSTEM[:LEVEL][@N],... where only every "
+                             f"Nth event is logged. Subsystems: {', '.join(trace.SUBSYSTEMS)}, all")
     parser.add_argument('-log', '--loglevel', default='info', help='Provide logging level')
 
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel.upper())
+    if args.trace is not None:
+        trace.configure(args.trace)
 
     input_path = os.path.expanduser(args.INPUT_PATH)
     logger.log(logging.INFO, f"Input path: {input_path}")
 
     if args.merge is not None:
-        label_lib.merge(args.merge, target_file=input_path, overwrite=True, yml_only=args.yml_only)
+        label_io.merge(args.merge, target_file=input_path, overwrite=True, yml_only=args.yml_only)
     if args.add is not None:
-        label_lib.merge(args.add, target_file=input_path, overwrite=False, yml_only=args.yml_only)
+        label_io.merge(args.add, target_file=input_path, overwrite=False, yml_only=args.yml_only)
     elif args.combine_cams is not None:
-        label_lib.combine_cams(args.combine_cams, target_file=input_path, yml_only=args.yml_only)
+        label_io.combine_cams(args.combine_cams, target_file=input_path, yml_only=args.yml_only)
     else:
+        # The Qt stack is only needed, and imported, in GUI mode
+        from PyQt5.QtWidgets import QApplication
+        from . import ui
+
+        if args.profile is not None:
+            perf.enable(Path(args.profile) if args.profile else None)
         app = QApplication([])
         gui = ui.MainWindow(Path(input_path), sync=args.sync[0] if len(args.sync) > 0 else False)
         gui.show()
@@ -0,0 +1,298 @@
+"""
+Headless benchmark of frame navigation, rendering, labeling and saving.
+
+Runs offscreen against a synthetic session (videos, sketch, labels) of configurable size and writes p50/p95/p99
+latencies as JSON. Run with `python -m labelgui.benchmark --help` for options.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+USER = 'bench'
+DATASET_NAME = 'bench'
+PERCENTILES = (50, 95, 99)
+# Entry point of command line jobs (--merge, --add, --combine_cams) and the GUI stack it must not import
+CLI_MODULE = 'labelgui.__main__'
+GUI_MODULES = ('PyQt5', 'pyqtgraph', 'pandas', 'paho', 'svidreader', 'matplotlib')
+
+
+def make_session(folder: Path, n_cams: int, n_frames: int, n_labels: int, width: int, height: int, fps: float,
+                 labeled_fraction: float, label_format: str, seed: int = 0) -> Path:
+    """Write synthetic videos, sketch, labels and job config to 'folder'. Returns the job config file."""
+    import imageio.v3 as iio
+    from bbo import label_lib
+
+    from labelgui import label_io
+
+    rng = np.random.default_rng(seed)
+    recording_folder = folder / 'recordings'
+    os.makedirs(recording_folder, exist_ok=True)
+
+    # Moving bars on noise, so that frames differ and compress like real recordings
+    for cam_idx in range(n_cams):
+        frames = rng.integers(0, 64, (n_frames, height, width), dtype=np.uint8)
+        for fr_idx in range(n_frames):
+            x = (fr_idx * 7 + cam_idx * 31) % max(1, width - 16)
+            frames[fr_idx, :, x:x + 16] = 255
+        iio.imwrite(recording_folder / f'cam{cam_idx}.mp4', np.repeat(frames[..., np.newaxis], 3, axis=-1),
+                    fps=fps)
+
+    label_names = [f'label{i}' for i in range(n_labels)]
+    sketch_file = folder / 'sketch.npy'
+    np.save(sketch_file, {
+        'sketch': rng.random((300, 400, 3)) * 255,
+        'sketch_label_locations': {ln: rng.random(2) * [400, 300] for ln in label_names},
+    }, allow_pickle=True)
+
+    labels = label_lib.get_empty_labels()
+    labels['labeler_list'].append(USER)
+    labeler_idx = labels['labeler_list'].index(USER)
+    labeled_frames = np.flatnonzero(rng.random(n_frames) < labeled_fraction)
+    for label_name in label_names:
+        labels['labels'][label_name] = {}
+        for fr_idx in labeled_frames:
+            coords = rng.random((n_cams, 2)) * [width, height]
+            coords[rng.random(n_cams) < 0.2] = np.nan
+            labels['labels'][label_name][int(fr_idx)] = {
+                'coords': coords,
+                'point_times': np.full(n_cams, time.time()),
+                'labeler': np.full(n_cams, labeler_idx, dtype=np.uint16),
+            }
+    labels_folder = folder / 'user' / USER / DATASET_NAME
+    os.makedirs(labels_folder, exist_ok=True)
+    label_io.save(labels_folder / f'labels.{label_format}', labels)
+
+    cfg = {
+        'sketch_files': [sketch_file.as_posix()],
+        'dataset_name': DATASET_NAME,
+        'recording_folder': recording_folder.as_posix(),
+        'recording_filenames': [f'cam{cam_idx}.mp4' for cam_idx in range(n_cams)],
+        'video_times': {cam_idx: {'fps': fps, 'offset': 0.0} for cam_idx in range(n_cams)},
+        'load_labels_file': None,
+        'reference_labels_file': False,
+        'allowed_cams': list(range(n_cams)),
+        'min_time': 0,
+        'max_time': int(np.ceil(n_frames / fps)) + 1,
+        'd_time': 0,
+        'sketch_zoom_scale': 0.1,
+        'exit_save_labels': False,
+        # Autosave is measured separately
+        'auto_save': False,
+        'auto_save_N0': 10,
+        'auto_save_N1': 100,
+        'controls': {
+            'buttons': {button: True for button in ['save_labels', 'single_label_mode', 'zoom_out', 'rotate',
+                                                    'previous_label', 'next_label', 'next_time', 'previous_time']},
+            'fields': {'current_time': True, 'd_time': True},
+        },
+    }
+    file_config = folder / 'labelgui_cfg.yml'
+    with open(file_config, 'w') as fh:
+        yaml.safe_dump(cfg, fh)
+    return file_config
+
+
+def measure_import(module: str) -> (float, List[str]):
+    """Import 'module' in a fresh interpreter. Returns the import time and the top-level packages it loaded."""
+    code = (f"import sys, time; t_start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - t_start); print(','.join(sorted({{m.split('.')[0] for m in sys.modules}})))")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    import_time, modules = output.strip().splitlines()[-2:]
+    return float(import_time), modules.split(',')
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples_ms = np.asarray(samples) * 1000
+    summary = {'n': len(samples_ms), 'mean_ms': float(np.mean(samples_ms))}
+    for percentile, value in zip(PERCENTILES, np.percentile(samples_ms, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = float(value)
+    return summary
+
+
+def run(args) -> dict:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QEventLoop
+    from PyQt5.QtWidgets import QApplication
+
+    from labelgui import __version__
+    from labelgui import ui
+
+    folder = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='labelgui_bench_'))
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(args.seed)
+
+    logger.log(logging.INFO, f"Creating synthetic session in {folder.as_posix()}")
+    file_config = make_session(folder, n_cams=args.cams, n_frames=args.frames, n_labels=args.labels,
+                               width=args.width, height=args.height, fps=args.fps,
+                               labeled_fraction=args.labeled_fraction, label_format=args.label_format,
+                               seed=args.seed)
+
+    app = QApplication.instance() or QApplication([])
+    samples: Dict[str, List[float]] = {}
+
+    cli_gui_modules = set()
+    for _ in range(args.import_repeats):
+        import_time, modules = measure_import(CLI_MODULE)
+        samples.setdefault('import_cli', []).append(import_time)
+        cli_gui_modules.update(set(modules) & set(GUI_MODULES))
+
+    def measure(name: str, action: Callable):
+        t_start = time.perf_counter()
+        action()
+        # Include the work that is triggered through the event loop (repaints, deferred updates)
+        app.processEvents()
+        samples.setdefault(name, []).append(time.perf_counter() - t_start)
+
+    def open_window():
+        window = ui.MainWindow(folder, file_config=file_config, user=USER, sync=False)
+        # The session loads in the background
+        while not window.gui_loaded:
+            if window.load_error is not None:
+                raise window.load_error
+            app.processEvents(QEventLoop.AllEvents, 10)
+        return window
+
+    for _ in range(args.startup_repeats):
+        window = None
+
+        def startup():
+            nonlocal window
+            window = open_window()
+
+        measure('startup', startup)
+        window.close()
+        window.save_thread.shutdown(wait=True)
+        window.deleteLater()
+        app.processEvents()
+
+    window = open_window()
+    app.processEvents()
+    n_times = len(window.time_index)
+
+    for _ in range(args.repeats):
+        if window.current_time_idx >= n_times - 1:
+            window.set_time(window.time_index[0])
+        measure('step_forward', window.goto_next_time)
+
+    for time_idx in rng.integers(0, n_times, args.repeats):
+        measure('jump', lambda: window.set_time(window.time_index[int(time_idx)]))
+
+    n_sketch_labels = window.dock_sketch.list_labels.count()
+    for row in rng.integers(0, max(1, n_sketch_labels), args.repeats):
+        measure('label_list_change', lambda: window.dock_sketch.list_labels.setCurrentRow(int(row)))
+
+    autosave_file = window.labels_folder / 'autosave' / window.labels_file.name
+    for _ in range(args.repeats):
+        cam_idx, subwin = list(window.subwindows.items())[int(rng.integers(0, len(window.subwindows)))]
+        x, y = rng.random(2) * [args.width, args.height]
+        measure('label_click', lambda: window.viewer_click(float(x), float(y), subwin.frame_idx, cam_idx,
+                                                           'create_label'))
+
+        measure('autosave', lambda: window.save_labels(autosave_file))
+        # Time until the save thread has written the file
+        t_start = time.perf_counter()
+        window.save_thread.submit(lambda: None).result()
+        samples.setdefault('autosave_write', []).append(time.perf_counter() - t_start + samples['autosave'][-1])
+
+    window.close()
+    window.save_thread.shutdown(wait=True)
+
+    if not args.workdir and not args.keep:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        'version': __version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': {name: summarize(values) for name, values in samples.items()},
+        'import_cli_gui_modules': sorted(cli_gui_modules),
+    }
+
+
+def check_import_budget(results: dict, budget_ms: float) -> bool:
+    """Whether the command line entry point imports within 'budget_ms' (p50) and without the GUI stack"""
+    import_ms = results['results']['import_cli']['p50_ms']
+    passed = True
+    if import_ms > budget_ms:
+        print(f"Import of {CLI_MODULE} took {import_ms:.0f} ms, budget is {budget_ms:.0f} ms", file=sys.stderr)
+        passed = False
+    if results['import_cli_gui_modules']:
+        print(f"Import of {CLI_MODULE} loads GUI modules: {', '.join(results['import_cli_gui_modules'])}",
+              file=sys.stderr)
+        passed = False
+    return passed
+
+
+def compare(results: dict, baseline: dict):
+    """Print the ratio of the latencies in 'results' to those in 'baseline'"""
+    print(f"{'benchmark':<20}" + "".join(f"{f'p{p} ratio':>12}" for p in PERCENTILES))
+    for name, summary in results['results'].items():
+        baseline_summary = baseline['results'].get(name)
+        if baseline_summary is None:
+            continue
+        ratios = [summary[f'p{p}_ms'] / baseline_summary[f'p{p}_ms'] if baseline_summary[f'p{p}_ms'] > 0
+                  else np.nan for p in PERCENTILES]
+        print(f"{name:<20}" + "".join(f"{ratio:>12.2f}" for ratio in ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LabelGUI - Headless latency benchmark on a synthetic session.")
+    parser.add_argument('--cams', type=int, default=4, help="Number of cameras")
+    parser.add_argument('--frames', type=int, default=200, help="Number of frames per camera")
+    parser.add_argument('--labels', type=int, default=50, help="Number of label names")
+    parser.add_argument('--labeled_fraction', type=float, default=0.3, help="Fraction of frames that carry labels")
+    parser.add_argument('--width', type=int, default=640, help="Frame width")
+    parser.add_argument('--height', type=int, default=480, help="Frame height")
+    parser.add_argument('--fps', type=float, default=20, help="Frame rate of the recordings")
+    parser.add_argument('--label_format', type=str, default='yml', choices=['yml', 'lbin'],
+                        help="Format of the labels file")
+    parser.add_argument('--repeats', type=int, default=50, help="Samples per benchmark")
+    parser.add_argument('--startup_repeats', type=int, default=3, help="Samples of the startup benchmark")
+    parser.add_argument('--import_repeats', type=int, default=5, help="Samples of the command line import benchmark")
+    parser.add_argument('--import_budget_ms', type=float, default=None,
+                        help="Exit with an error if importing the command line entry point takes longer (p50) or "
+                             "imports GUI modules")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--workdir', type=str, default=None,
+                        help="Folder for the synthetic session. Defaults to a temporary folder that is deleted.")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary session folder")
+    parser.add_argument('--output', type=str, default=None, help="JSON file for the results, default: stdout")
+    parser.add_argument('--compare', type=str, default=None, help="JSON results of a previous run to compare to")
+    parser.add_argument('-log', '--loglevel', default='warning', help='Provide logging level')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.loglevel.upper())
+
+    results = run(args)
+    if args.output is not None:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fh:
+            compare(results, json.load(fh))
+
+    if args.import_budget_ms is not None and not check_import_budget(results, args.import_budget_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
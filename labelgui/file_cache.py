@@ -0,0 +1,37 @@
+"""
+Plain .npz caches of data derived from a source file, e.g. sketches and recording metadata.
+
+A cache file is keyed by path, size and modification time of its source file, so it is invalidated by any change of
+the source. Cache files are never unpickled.
+"""
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_file(file_path: Path, cache_folder: Path, version: int = 1) -> Path:
+    """Cache file of file_path in cache_folder. Bump version when the cached content changes."""
+    stat = file_path.stat()
+    key = f"{version}:{file_path.resolve().as_posix()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return cache_folder / f"{hashlib.sha1(key.encode()).hexdigest()}.npz"
+
+
+def save_cache(cache_file: Path, **arrays) -> bool:
+    """
+    Write arrays to cache_file via a temporary file, so that readers never see a partial cache. Failures are logged,
+    as a missing cache only costs time.
+    """
+    try:
+        os.makedirs(cache_file.parent, exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp.npz')
+        np.savez(tmp_file, **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.log(logging.WARNING, f"Writing cache {cache_file} failed: {e}")
+        return False
+    return True
@@ -0,0 +1,220 @@
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+import svidreader
+
+from labelgui import trace
+
+logger = logging.getLogger(__name__)
+trace_decode = trace.get_tracer('decode')
+
+
+def open_reader(source: str):
+    return svidreader.get_reader(source, backend="iio", cache=True)
+
+
+class FrameCache:
+    """
+    Memory-bounded LRU cache of decoded frames of a single reader.
+
+    Decoding is serialized per reader, as video readers are generally not thread safe. Cached frames are
+    read-only and must not be modified by the caller. 'source' is the path the reader was opened from, it allows
+    decoding in other processes.
+    """
+
+    def __init__(self, reader, max_bytes: int = 256 * 1024 ** 2, source: str | None = None):
+        self.reader = reader
+        self.max_bytes = max_bytes
+        self.source = source
+
+        self._frames: OrderedDict = OrderedDict()
+        # Decimated versions of cached frames, level n at index n - 1
+        self._pyramids: Dict[int, List[np.ndarray]] = {}
+        self._n_bytes = 0
+        self._cache_lock = threading.Lock()
+        self._reader_lock = threading.Lock()
+
+    def get(self, frame_idx: int) -> np.ndarray:
+        frame = self.lookup(frame_idx)
+        if frame is not None:
+            return frame
+
+        with self._reader_lock:
+            # Another thread might have decoded the frame while we were waiting for the reader
+            frame = self.lookup(frame_idx)
+            if frame is None:
+                frame = self._decode(frame_idx)
+        return frame
+
+    def lookup(self, frame_idx: int) -> np.ndarray | None:
+        with self._cache_lock:
+            frame = self._frames.get(frame_idx)
+            if frame is not None:
+                self._frames.move_to_end(frame_idx)
+            return frame
+
+    def get_level(self, frame_idx: int, level: int) -> np.ndarray:
+        """Frame decimated by 2**level along both image axes, level 0 is the frame itself"""
+        frame = self.get(frame_idx)
+        if level <= 0:
+            return frame
+
+        with self._cache_lock:
+            pyramid = self._pyramids.get(frame_idx, [])
+            if len(pyramid) >= level:
+                return pyramid[level - 1]
+
+        image = pyramid[-1] if len(pyramid) else frame
+        new_levels = []
+        for _ in range(len(pyramid), level):
+            image = np.ascontiguousarray(image[::2, ::2])
+            image.setflags(write=False)
+            new_levels.append(image)
+
+        with self._cache_lock:
+            if frame_idx in self._frames:
+                cached_pyramid = self._pyramids.setdefault(frame_idx, [])
+                if len(cached_pyramid) == len(pyramid):
+                    cached_pyramid.extend(new_levels)
+                    self._n_bytes += sum(lvl.nbytes for lvl in new_levels)
+        return image
+
+    def contains(self, frame_idx: int) -> bool:
+        with self._cache_lock:
+            return frame_idx in self._frames
+
+    def clear(self):
+        with self._cache_lock:
+            self._frames.clear()
+            self._pyramids.clear()
+            self._n_bytes = 0
+
+    def put(self, frame_idx: int, frame: np.ndarray) -> np.ndarray:
+        """Insert a frame that was decoded elsewhere"""
+        frame.setflags(write=False)
+        return self._insert(frame_idx, frame)
+
+    def _decode(self, frame_idx: int) -> np.ndarray:
+        # The reader may reuse its output buffer, so the frame is copied once on decode instead of on every redraw
+        t_start = time.perf_counter() if trace_decode.enabled else None
+        frame = np.array(self.reader.get_data(frame_idx), copy=True)
+        frame.setflags(write=False)
+        if t_start is not None:
+            trace_decode.log(logging.DEBUG, "Decoded frame %s of %s in %.1f ms", frame_idx, self.source,
+                             (time.perf_counter() - t_start) * 1000)
+        return self._insert(frame_idx, frame)
+
+    def _insert(self, frame_idx: int, frame: np.ndarray) -> np.ndarray:
+        with self._cache_lock:
+            if frame_idx not in self._frames:
+                self._frames[frame_idx] = frame
+                self._n_bytes += frame.nbytes
+            # Evict least recently used frames, but always keep the newest one
+            while self._n_bytes > self.max_bytes and len(self._frames) > 1:
+                evicted_idx, evicted = self._frames.popitem(last=False)
+                self._n_bytes -= evicted.nbytes
+                self._n_bytes -= sum(lvl.nbytes for lvl in self._pyramids.pop(evicted_idx, []))
+        return frame
+
+
+class FramePrefetcher:
+    """
+    Decodes frames into FrameCaches in worker threads.
+
+    Each call to prefetch supersedes all earlier requests, so that queued frames of an outdated position are skipped.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+        self._generation = 0
+
+    def prefetch(self, requests: Dict[int, tuple[FrameCache, List[int]]]):
+        """
+        Args:
+            requests: Maps a camera index to its cache and the frame indices to decode, in order of priority.
+        """
+        self._generation += 1
+        generation = self._generation
+
+        # Interleave cameras so that the next frame of every camera is decoded first
+        queues = [[(cache, fr_idx) for fr_idx in frame_idxs if not cache.contains(fr_idx)]
+                  for cache, frame_idxs in requests.values()]
+        for i_req in range(max((len(q) for q in queues), default=0)):
+            for queue in queues:
+                if i_req < len(queue):
+                    self.executor.submit(self._prefetch_frame, generation, *queue[i_req])
+
+    def _prefetch_frame(self, generation: int, cache: FrameCache, frame_idx: int):
+        if generation != self._generation or cache.contains(frame_idx):
+            return
+        try:
+            cache.get(frame_idx)
+        except Exception as e:
+            logger.log(logging.DEBUG, f"Prefetching frame {frame_idx} failed: {e}")
+
+    def shutdown(self):
+        self._generation += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Readers opened by a worker process of ParallelDecoder, by source
+_process_readers = {}
+
+
+def _decode_in_process(source: str, frame_idx: int) -> np.ndarray:
+    reader = _process_readers.get(source)
+    if reader is None:
+        reader = _process_readers[source] = open_reader(source)
+    return np.array(reader.get_data(frame_idx), copy=True)
+
+
+class ParallelDecoder:
+    """
+    Decodes one frame each of several readers concurrently, so that the latency of a frame change approaches that of
+    the slowest reader instead of the sum of all.
+
+    Threads suffice for backends that release the GIL while decoding. With processes, each worker opens its own
+    readers from the source of a FrameCache and sends back the decoded frames.
+    """
+
+    def __init__(self, max_workers: int = 4, use_processes=False):
+        self.use_processes = use_processes
+        if use_processes:
+            # Forking a process with a running Qt application is not safe
+            self.executor = ProcessPoolExecutor(max_workers=max(1, max_workers),
+                                                mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="decode")
+
+    def decode(self, requests: List[tuple[FrameCache, int]]):
+        """Decode the requested frames into their caches. Returns once all of them are cached."""
+        requests = [(cache, fr_idx) for cache, fr_idx in requests if not cache.contains(fr_idx)]
+        if len(requests) < 2 and not self.use_processes:
+            return
+
+        futures = {}
+        for cache, fr_idx in requests:
+            if not self.use_processes:
+                futures[self.executor.submit(cache.get, fr_idx)] = (cache, fr_idx)
+            elif cache.source is not None:
+                futures[self.executor.submit(_decode_in_process, cache.source, fr_idx)] = (cache, fr_idx)
+
+        for future in as_completed(futures):
+            cache, fr_idx = futures[future]
+            try:
+                frame = future.result()
+            except Exception as e:
+                # The frame is decoded again on access, which reports the error
+                logger.log(logging.WARNING, f"Decoding frame {fr_idx} failed: {e}")
+                continue
+            if self.use_processes:
+                cache.put(fr_idx, frame)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,157 @@
+from typing import Dict
+
+import numpy as np
+
+from labelgui.label_store import LabelStore
+
+
+class LabelGuesser:
+    """
+    Guesses the positions of missing labels of a frame from the labels of its neighboring frames.
+
+    Guesses for all labels and cameras of a frame are computed at once from the (offsets × labels × cams × 2) block
+    of the frames within 'window' of it. Strategies:
+        nearest:   closest labeled frame, the previous one first on ties
+        symmetric: mean of the closest pair of labeled frames at equal distance, else nearest
+        linear:    linear interpolation between the closest previous and next labeled frame, else nearest
+        cubic:     cubic interpolation through the two closest labeled frames on each side, else linear
+    Results are cached per frame. A cached frame is invalidated when the labels of a frame within its window change.
+    """
+    STRATEGIES = ('nearest', 'symmetric', 'linear', 'cubic')
+    MAX_CACHED_FRAMES = 1024
+
+    def __init__(self, labels: LabelStore, strategy: str = 'symmetric', window: int = 3):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown guess strategy {strategy}, use one of {self.STRATEGIES}")
+        self.labels = labels
+        self.strategy = strategy
+        self.window = max(1, int(window))
+
+        self._cache: Dict[int, np.ndarray] = {}
+        self._generation = labels.generation
+
+    def get_guesses(self, frame_idx: int) -> np.ndarray:
+        """Returns guessed coordinates (labels × cams × 2) in the label order of the store, NaN if there is none"""
+        self._invalidate_changes()
+
+        guesses = self._cache.get(frame_idx)
+        if guesses is None:
+            guesses = self._compute(frame_idx)
+            self._cache[frame_idx] = guesses
+            if len(self._cache) > self.MAX_CACHED_FRAMES:
+                del self._cache[next(iter(self._cache))]
+
+        n_labels = len(self.labels.label_names)
+        if len(guesses) < n_labels:
+            # Labels added since the guesses were computed have no entries near this frame
+            guesses = np.concatenate((guesses, np.full((n_labels - len(guesses),) + guesses.shape[1:], np.nan)))
+        return guesses
+
+    @property
+    def generation(self) -> int:
+        """Generation of the label store the cached guesses are up to date with"""
+        return self._generation
+
+    def clear(self):
+        self._cache.clear()
+        self._generation = self.labels.generation
+
+    def _invalidate_changes(self):
+        if self._generation == self.labels.generation:
+            return
+        if self._generation < self.labels.forgotten_generation:
+            # The changes are no longer known
+            self.clear()
+            return
+        changed_frame_idxs = {fr_idx for _, fr_idx in self.labels.get_changes(self._generation)}
+        self._generation = self.labels.generation
+        for fr_idx in changed_frame_idxs:
+            for neighbor_idx in range(fr_idx - self.window, fr_idx + self.window + 1):
+                self._cache.pop(neighbor_idx, None)
+
+    def _compute(self, frame_idx: int) -> np.ndarray:
+        offsets = np.arange(1, self.window + 1)
+        # (offsets × labels × cams × 2), ordered by distance
+        previous_coords = np.stack([self.labels.get_frame_coords(frame_idx - offs) for offs in offsets])
+        next_coords = np.stack([self.labels.get_frame_coords(frame_idx + offs) for offs in offsets])
+        previous_valid = ~np.any(np.isnan(previous_coords), axis=-1)
+        next_valid = ~np.any(np.isnan(next_coords), axis=-1)
+
+        guesses = self._nearest(previous_coords, previous_valid, next_coords, next_valid)
+        match self.strategy:
+            case 'symmetric':
+                guesses = self._fill(self._symmetric(previous_coords, next_coords, previous_valid & next_valid),
+                                     guesses)
+            case 'linear':
+                guesses = self._fill(self._linear(offsets, previous_coords, previous_valid, next_coords, next_valid),
+                                     guesses)
+            case 'cubic':
+                guesses = self._fill(self._linear(offsets, previous_coords, previous_valid, next_coords, next_valid),
+                                     guesses)
+                guesses = self._fill(self._cubic(offsets, previous_coords, previous_valid, next_coords, next_valid),
+                                     guesses)
+        return guesses
+
+    @staticmethod
+    def _fill(guesses: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(guesses), fallback, guesses)
+
+    @staticmethod
+    def _take(coords: np.ndarray, idxs: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(coords, idxs[np.newaxis, ..., np.newaxis], axis=0)[0]
+
+    @staticmethod
+    def _closest(valid: np.ndarray, n: int = 1):
+        """Offset indices of the n closest valid frames (n × labels × cams), and whether they exist"""
+        valid = valid.copy()
+        idxs = []
+        found = []
+        for _ in range(n):
+            idx = np.argmax(valid, axis=0)
+            is_found = np.take_along_axis(valid, idx[np.newaxis], axis=0)[0]
+            np.put_along_axis(valid, idx[np.newaxis], False, axis=0)
+            idxs.append(idx)
+            found.append(is_found)
+        return np.stack(idxs), np.stack(found)
+
+    def _nearest(self, previous_coords, previous_valid, next_coords, next_valid) -> np.ndarray:
+        # Interleave previous and next frames: -1, 1, -2, 2, ...
+        coords = np.stack((previous_coords, next_coords), axis=1).reshape((-1,) + previous_coords.shape[1:])
+        valid = np.stack((previous_valid, next_valid), axis=1).reshape((-1,) + previous_valid.shape[1:])
+        idx, found = self._closest(valid)
+        return np.where(found[0][..., np.newaxis], self._take(coords, idx[0]), np.nan)
+
+    def _symmetric(self, previous_coords, next_coords, pair_valid) -> np.ndarray:
+        idx, found = self._closest(pair_valid)
+        guesses = (self._take(previous_coords, idx[0]) + self._take(next_coords, idx[0])) / 2
+        return np.where(found[0][..., np.newaxis], guesses, np.nan)
+
+    def _linear(self, offsets, previous_coords, previous_valid, next_coords, next_valid) -> np.ndarray:
+        previous_idx, previous_found = self._closest(previous_valid)
+        next_idx, next_found = self._closest(next_valid)
+        d_previous = offsets[previous_idx[0]][..., np.newaxis]
+        d_next = offsets[next_idx[0]][..., np.newaxis]
+        previous_point = self._take(previous_coords, previous_idx[0])
+        next_point = self._take(next_coords, next_idx[0])
+        guesses = previous_point + (next_point - previous_point) * d_previous / (d_previous + d_next)
+        return np.where((previous_found[0] & next_found[0])[..., np.newaxis], guesses, np.nan)
+
+    def _cubic(self, offsets, previous_coords, previous_valid, next_coords, next_valid) -> np.ndarray:
+        previous_idx, previous_found = self._closest(previous_valid, n=2)
+        next_idx, next_found = self._closest(next_valid, n=2)
+
+        # Lagrange interpolation at offset 0 through two frames on each side
+        xs = np.concatenate((-offsets[previous_idx], offsets[next_idx])).astype(np.float64)
+        ys = np.stack([self._take(previous_coords, idx) for idx in previous_idx] +
+                      [self._take(next_coords, idx) for idx in next_idx])
+        weights = np.ones_like(xs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Nodes coincide where fewer than two frames were found, these are discarded below
+            for i in range(len(xs)):
+                for j in range(len(xs)):
+                    if i != j:
+                        weights[i] *= -xs[j] / (xs[i] - xs[j])
+            guesses = np.sum(weights[..., np.newaxis] * ys, axis=0)
+
+        found = np.all(previous_found, axis=0) & np.all(next_found, axis=0)
+        return np.where(found[..., np.newaxis], guesses, np.nan)
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from bbo import label_lib
+
+from labelgui.label_store import LabelStore
+
+logger = logging.getLogger(__name__)
+
+BINARY_SUFFIX = '.lbin'
+BINARY_MAGIC = b'LBLBIN01'
+BINARY_ALIGNMENT = 64
+# Files that are memory-mapped cannot be replaced on Windows, so they are read into memory there
+BINARY_MMAP = os.name != 'nt'
+
+
+def is_binary(file_path) -> bool:
+    return Path(file_path).suffix == BINARY_SUFFIX
+
+
+def load(file_path, n_cams: int | None = None) -> LabelStore:
+    """
+    Load labels from a yml or binary label file, depending on the file extension. Labels with fewer than n_cams
+    cameras are padded to n_cams.
+    """
+    file_path = Path(file_path)
+    if is_binary(file_path):
+        labels = load_binary(file_path)
+        if n_cams is not None:
+            labels.widen_cams(n_cams)
+        return labels
+    return LabelStore.from_labels(label_lib.load(file_path, v0_format=False), n_cams=n_cams)
+
+
+def save(file_path, labels: LabelStore | dict, yml_only=False):
+    """Save labels to a yml or binary label file, depending on the file extension"""
+    file_path = Path(file_path)
+    if is_binary(file_path):
+        if isinstance(labels, dict):
+            labels = LabelStore.from_labels(label_lib.update(labels))
+        save_binary(file_path, labels)
+    else:
+        if isinstance(labels, LabelStore):
+            labels = labels.to_labels()
+        label_lib.save(file_path, labels, yml_only=yml_only)
+
+
+def load_dict(file_path) -> dict:
+    """Load labels from any label file in bbo.label_lib format"""
+    if is_binary(file_path):
+        return load_binary(Path(file_path)).to_labels()
+    return label_lib.load(file_path, v0_format=False)
+
+
+def merge(labels_files: List[str], target_file, overwrite=False, yml_only=False):
+    """label_lib.merge for yml and binary label files"""
+    labels_list = [load_dict(file) if is_binary(file) else file for file in labels_files]
+    if not is_binary(target_file):
+        return label_lib.merge(labels_list, target_file=target_file, overwrite=overwrite, yml_only=yml_only)
+
+    # label_lib can only write yml, so the merged result is written here
+    labels = label_lib.merge([load_dict(target_file)] + labels_list, target_file=None, overwrite=overwrite)
+    save(target_file, labels)
+    return labels
+
+
+def combine_cams(labels_files: List[str], target_file, yml_only=False):
+    """label_lib.combine_cams for yml and binary label files"""
+    labels_list = [load_dict(file) if is_binary(file) else file for file in labels_files]
+    if not is_binary(target_file):
+        return label_lib.combine_cams(labels_list, target_file=target_file, yml_only=yml_only)
+
+    labels = label_lib.combine_cams(labels_list, target_file=None)
+    save(target_file, labels)
+    return labels
+
+
+def save_binary(file_path: Path, labels: LabelStore):
+    """
+    Write labels as a binary label file: a JSON header followed by the arrays of the label store, with all chunks
+    concatenated along the frame axis. The file is written to a temporary file first, so that a concurrently
+    memory-mapped version of it stays intact.
+    """
+    n_labels = len(labels.label_names)
+    n_rows = len(labels.chunks) * labels.CHUNK_SIZE
+    shapes = {
+        'coords': (n_labels, n_rows, labels.n_cams, 2),
+        'point_times': (n_labels, n_rows, labels.n_cams),
+        'labeler': (n_labels, n_rows, labels.n_cams),
+        'exists': (n_labels, n_rows),
+    }
+    empty_chunk = labels._new_chunk(n_labels)
+
+    header = {
+        'version': labels.version,
+        'n_cams': labels.n_cams,
+        'chunk_size': labels.CHUNK_SIZE,
+        'label_names': labels.label_names,
+        'labeler_list': labels.labeler_list,
+        'action_list': labels.action_list,
+        'frame_idxs': labels.frame_idxs,
+        'extras': [
+            {'label': label_name, 'frame': fr_idx,
+             'fields': {field: np.asarray(value).tolist() for field, value in fields.items()}}
+            for (label_name, fr_idx), fields in labels.extras.items()
+        ],
+        'arrays': {},
+    }
+    offset = 0
+    for field in labels.FIELDS:
+        dtype = empty_chunk[field].dtype
+        header['arrays'][field] = {'dtype': dtype.str, 'shape': shapes[field], 'offset': offset}
+        offset += _aligned(int(np.prod(shapes[field])) * dtype.itemsize)
+
+    header_bytes = json.dumps(header).encode()
+    data_offset = _aligned(len(BINARY_MAGIC) + 8 + len(header_bytes))
+
+    os.makedirs(file_path.parent, exist_ok=True)
+    tmp_file = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_file, 'wb') as fh:
+        fh.write(BINARY_MAGIC)
+        fh.write(np.uint64(len(header_bytes)).tobytes())
+        fh.write(header_bytes)
+        fh.truncate(data_offset + offset)
+
+    for field in labels.FIELDS:
+        array_info = header['arrays'][field]
+        if 0 in array_info['shape']:
+            continue
+        out = np.memmap(tmp_file, dtype=np.dtype(array_info['dtype']), mode='r+',
+                        offset=data_offset + array_info['offset'], shape=tuple(array_info['shape']))
+        for chunk_idx, chunk in enumerate(labels.chunks):
+            rows = slice(chunk_idx * labels.CHUNK_SIZE, (chunk_idx + 1) * labels.CHUNK_SIZE)
+            n_chunk_labels = chunk[field].shape[0]
+            out[:n_chunk_labels, rows] = chunk[field]
+            out[n_chunk_labels:, rows] = empty_chunk[field][n_chunk_labels:]
+        out.flush()
+        del out
+
+    os.replace(tmp_file, file_path)
+
+
+def load_binary(file_path: Path, mmap: bool = BINARY_MMAP) -> LabelStore:
+    """
+    Load a binary label file. With mmap, the arrays are mapped copy-on-write, so only the chunks that are accessed
+    are read from disk and edits never touch the file.
+    """
+    with open(file_path, 'rb') as fh:
+        if fh.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{file_path.as_posix()} is not a binary label file")
+        header_length = int(np.frombuffer(fh.read(8), dtype=np.uint64)[0])
+        header = json.loads(fh.read(header_length).decode())
+    data_offset = _aligned(len(BINARY_MAGIC) + 8 + header_length)
+
+    arrays = {}
+    for field, array_info in header['arrays'].items():
+        dtype = np.dtype(array_info['dtype'])
+        shape = tuple(array_info['shape'])
+        if mmap and 0 not in shape:
+            arrays[field] = np.memmap(file_path, dtype=dtype, mode='c', offset=data_offset + array_info['offset'],
+                                      shape=shape)
+        else:
+            with open(file_path, 'rb') as fh:
+                fh.seek(data_offset + array_info['offset'])
+                arrays[field] = np.fromfile(fh, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+    chunk_size = header['chunk_size']
+    n_chunks = arrays['exists'].shape[1] // chunk_size
+    chunks = [{field: arrays[field][:, chunk_idx * chunk_size:(chunk_idx + 1) * chunk_size] for field in arrays}
+              for chunk_idx in range(n_chunks)]
+
+    if chunk_size != LabelStore.CHUNK_SIZE:
+        # Files written with a different chunk size are converted on load
+        return LabelStore.from_labels(
+            LabelStore.from_chunks(header['n_cams'], header['label_names'], header['frame_idxs'], chunks,
+                                   header['labeler_list'], header['action_list'], header['version'],
+                                   _read_extras(header)).to_labels())
+
+    return LabelStore.from_chunks(header['n_cams'], header['label_names'], header['frame_idxs'], chunks,
+                                  header['labeler_list'], header['action_list'], header['version'],
+                                  _read_extras(header))
+
+
+def _read_extras(header: dict) -> dict:
+    return {(extra['label'], extra['frame']): {field: np.asarray(value) for field, value in extra['fields'].items()}
+            for extra in header['extras']}
+
+
+def _aligned(n_bytes: int) -> int:
+    return -(-n_bytes // BINARY_ALIGNMENT) * BINARY_ALIGNMENT
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from labelgui.label_store import LabelStore
+
+logger = logging.getLogger(__name__)
+
+
+class LabelJournal:
+    """
+    Append-only journal of label edits, stored next to the labels file it belongs to.
+
+    Every edit is appended as one JSON line holding the complete new state of a single point, so replaying a record
+    more than once is harmless. On save, the active journal is rotated into a numbered segment, which is deleted once
+    the full labels file has been written (compaction). Segments of failed or interrupted saves are kept and replayed
+    on the next start.
+
+    Records are flushed to the OS on append, so they survive a crash of the GUI. Syncing them to disk takes
+    milliseconds and is done in sync_thread instead, batching the records appended in the meantime.
+    """
+
+    def __init__(self, labels_file: Path):
+        self.journal_file = labels_file.with_suffix('.journal')
+        self._file_handle = None
+        self._lock = threading.Lock()
+        self._sync_pending = False
+        self.sync_thread = ThreadPoolExecutor(max_workers=1)
+
+    def get_segment_files(self) -> List[Path]:
+        segments = []
+        for file in self.journal_file.parent.glob(f"{self.journal_file.name}.*"):
+            if file.suffix[1:].isdigit():
+                segments.append(file)
+        return sorted(segments, key=lambda f: int(f.suffix[1:]))
+
+    def replay(self, labels: LabelStore) -> int:
+        """Apply all journaled edits to 'labels'. Returns the number of applied records."""
+        n_records = 0
+        for file in self.get_segment_files() + [self.journal_file]:
+            if not file.is_file():
+                continue
+            with open(file, 'r') as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Only the last record of a crashed session can be incomplete
+                        logger.log(logging.WARNING, f"Skipping incomplete journal record in {file.as_posix()}")
+                        continue
+                    self.apply_record(labels, record)
+                    n_records += 1
+        return n_records
+
+    @staticmethod
+    def apply_record(labels: LabelStore, record: dict, newer_only=False) -> bool:
+        """
+        Set the point of a record. With newer_only, the record is only applied if it is newer than the point in
+        'labels' (last writer wins). Returns whether the record was applied.
+        """
+        if newer_only:
+            point_time = labels.get_point_time(record['label'], record['frame'], record['cam'])
+            if point_time is not None and point_time >= record['point_time']:
+                return False
+        coords = np.nan if record['coords'] is None else np.asarray(record['coords'], dtype=np.float64)
+        labels.set_point(record['label'], record['frame'], record['cam'], coords,
+                         point_time=record['point_time'], labeler_idx=labels.get_labeler_idx(record['labeler']))
+        return True
+
+    @staticmethod
+    def make_record(labels: LabelStore, label_name: str, frame_idx: int, cam_idx: int) -> dict:
+        """Record of the current state of a point in 'labels'"""
+        entry = labels.get_entry(label_name, frame_idx)
+        coords = entry['coords'][cam_idx]
+        return {
+            'label': label_name,
+            'frame': int(frame_idx),
+            'cam': int(cam_idx),
+            'coords': None if np.any(np.isnan(coords)) else coords.tolist(),
+            'point_time': float(entry['point_times'][cam_idx]),
+            'labeler': labels.labeler_list[entry['labeler'][cam_idx]],
+        }
+
+    def append(self, record: dict):
+        with self._lock:
+            if self._file_handle is None:
+                self._file_handle = open(self.journal_file, 'a')
+            self._file_handle.write(json.dumps(record) + "\n")
+            self._file_handle.flush()
+            if self._sync_pending:
+                # Included in the pending sync
+                return
+            self._sync_pending = True
+        self.sync_thread.submit(self._sync)
+
+    def _sync(self):
+        with self._lock:
+            self._sync_pending = False
+            if self._file_handle is None:
+                # Synced on close
+                return
+            # Syncing a duplicate does not block append and stays valid if the journal is closed meanwhile
+            fd = os.dup(self._file_handle.fileno())
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            logger.log(logging.ERROR, f"Syncing journal {self.journal_file.as_posix()} failed: {e}")
+        finally:
+            os.close(fd)
+
+    def _close_file(self):
+        if self._file_handle is not None:
+            self._file_handle.flush()
+            os.fsync(self._file_handle.fileno())
+            self._file_handle.close()
+            self._file_handle = None
+
+    def rotate(self) -> int:
+        """Close the active journal and turn it into a new segment. Returns the number of that segment."""
+        with self._lock:
+            self._close_file()
+
+            segment_files = self.get_segment_files()
+            segment = int(segment_files[-1].suffix[1:]) + 1 if len(segment_files) else 0
+            if self.journal_file.is_file():
+                os.replace(self.journal_file, self.journal_file.with_name(f"{self.journal_file.name}.{segment}"))
+            return segment
+
+    def compact(self, segment: int):
+        """Delete all segments up to and including 'segment', after their edits were written to the labels file"""
+        for file in self.get_segment_files():
+            if int(file.suffix[1:]) <= segment:
+                file.unlink(missing_ok=True)
+
+    def close(self):
+        with self._lock:
+            self._close_file()
@@ -0,0 +1,392 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+from bbo import label_lib
+from bbo.exceptions import NoDataException
+
+
+class LabelStore:
+    """
+    Columnar in-memory storage of labels.
+
+    Frames that carry at least one entry are assigned a row in the frame index. Rows are grouped in chunks of
+    CHUNK_SIZE frames, each holding the arrays
+        coords:      (labels × frames × cams × 2) float64, NaN if not labeled
+        point_times: (labels × frames × cams) float64
+        labeler:     (labels × frames × cams) uint16, index into labeler_list
+        exists:      (labels × frames) bool, whether the label has an entry for the frame
+    The label dimension of a chunk only grows once a label is written to it, labels beyond its size are treated as
+    not existing. All labels of one frame are therefore a single slice of one chunk.
+
+    The store converts losslessly to and from the bbo.label_lib dict format (v1, i.e. v0_format=False).
+    """
+
+    CHUNK_SIZE = 256
+    FIELDS = ('coords', 'point_times', 'labeler', 'exists')
+
+    def __init__(self, n_cams: int, label_names: Sequence[str] = (), labeler_list: List[str] | None = None,
+                 action_list: List[str] | None = None, version: str = label_lib.version):
+        empty_labels = label_lib.get_empty_labels()
+
+        self.n_cams = n_cams
+        self.version = version
+        self.labeler_list = list(labeler_list) if labeler_list is not None else empty_labels['labeler_list']
+        self.action_list = list(action_list) if action_list is not None else empty_labels['action_list']
+
+        self.label_names: List[str] = []
+        self.label_idxs: Dict[str, int] = {}
+        self.frame_idxs: List[int] = []  # Row -> frame index
+        self.frame_rows: Dict[int, int] = {}  # Frame index -> row
+        self.chunks: List[Dict[str, np.ndarray]] = []
+        # Entry fields beyond coords, point_times and labeler (e.g. 'action'), by (label_name, frame_idx)
+        self.extras: Dict[tuple, dict] = {}
+        # Indices of chunks whose arrays are shared with a snapshot
+        self._shared_chunks: set = set()
+        # Incremented on every write. Maps (label_name, frame_idx) of changed entries to the generation of their last
+        # change.
+        self.generation = 0
+        self.dirty: Dict[tuple, int] = {}
+        # Changes up to this generation were dropped from dirty by forget_changes
+        self.forgotten_generation = 0
+
+        for label_name in label_names:
+            self.add_label_name(label_name)
+
+    # Conversion
+    @classmethod
+    def from_labels(cls, labels: dict, n_cams: int | None = None):
+        """
+        Create a store from labels in bbo.label_lib format. n_cams is taken from the data if it is not given or smaller.
+        """
+        try:
+            data_n_cams = label_lib.get_n_cams(labels)
+        except NoDataException:
+            data_n_cams = 0
+        if n_cams is None or n_cams < data_n_cams:
+            n_cams = data_n_cams
+
+        store = cls(n_cams=n_cams, label_names=list(labels['labels'].keys()),
+                    labeler_list=labels['labeler_list'], action_list=labels['action_list'],
+                    version=str(labels['version']))
+
+        frame_idxs = sorted({fr_idx for label_dict in labels['labels'].values() for fr_idx in label_dict})
+        for fr_idx in frame_idxs:
+            store.get_row(fr_idx, create=True)
+
+        for label_name, label_dict in labels['labels'].items():
+            for fr_idx, entry in label_dict.items():
+                store.set_entry(label_name, fr_idx, **entry)
+        store.generation = 0
+        store.dirty.clear()
+        return store
+
+    @classmethod
+    def from_chunks(cls, n_cams: int, label_names: Sequence[str], frame_idxs: Sequence[int],
+                    chunks: List[Dict[str, np.ndarray]], labeler_list: List[str], action_list: List[str],
+                    version: str = label_lib.version, extras: Dict[tuple, dict] | None = None):
+        """Create a store directly from chunk arrays, e.g. memory-mapped from a binary label file"""
+        store = cls(n_cams=n_cams, label_names=label_names, labeler_list=labeler_list, action_list=action_list,
+                    version=version)
+        store.frame_idxs = [int(fr_idx) for fr_idx in frame_idxs]
+        store.frame_rows = {fr_idx: row for row, fr_idx in enumerate(store.frame_idxs)}
+        store.chunks = chunks
+        store.extras = extras if extras is not None else {}
+        return store
+
+    def snapshot(self):
+        """
+        Point-in-time copy that shares all chunk arrays with this store. Shared chunks are only copied once either
+        side writes to them (copy-on-write), so taking a snapshot is cheap and it stays consistent while the store
+        is edited. Changes are only tracked by this store, the snapshot starts without any.
+        """
+        snapshot = LabelStore(self.n_cams, labeler_list=self.labeler_list, action_list=self.action_list,
+                              version=self.version)
+        snapshot.label_names = self.label_names.copy()
+        snapshot.label_idxs = self.label_idxs.copy()
+        snapshot.frame_idxs = self.frame_idxs.copy()
+        snapshot.frame_rows = self.frame_rows.copy()
+        snapshot.chunks = self.chunks.copy()
+        snapshot.extras = self.extras.copy()
+        snapshot.generation = self.generation
+        snapshot.forgotten_generation = self.generation
+
+        self._shared_chunks = set(range(len(self.chunks)))
+        snapshot._shared_chunks = set(range(len(self.chunks)))
+        return snapshot
+
+    def to_labels(self) -> dict:
+        """Convert to bbo.label_lib format. Arrays are copies, frames are sorted."""
+        labels = {
+            'version': self.version,
+            'labeler_list': self.labeler_list.copy(),
+            'action_list': self.action_list.copy(),
+            'labels': {},
+        }
+        sorted_frame_idxs = sorted(self.frame_rows)
+        for label_idx, label_name in enumerate(self.label_names):
+            label_dict = {}
+            for fr_idx in sorted_frame_idxs:
+                entry = self.get_entry(label_name, fr_idx, label_idx=label_idx)
+                if entry is not None:
+                    label_dict[fr_idx] = entry
+            labels['labels'][label_name] = label_dict
+        return labels
+
+    # Structure
+    def __len__(self):
+        return len(self.label_names)
+
+    def widen_cams(self, n_cams: int):
+        """Grow the camera dimension to n_cams, new cameras have no points. Chunks are copied, i.e. no longer mapped."""
+        if n_cams <= self.n_cams:
+            return
+        old_n_cams = self.n_cams
+        self.n_cams = n_cams
+        for chunk_idx, chunk in enumerate(self.chunks):
+            wide_chunk = self._new_chunk(chunk['exists'].shape[0])
+            wide_chunk['exists'][:] = chunk['exists']
+            for field in ('coords', 'point_times', 'labeler'):
+                wide_chunk[field][:, :, :old_n_cams] = chunk[field]
+            self.chunks[chunk_idx] = wide_chunk
+        self._shared_chunks.clear()
+
+    def add_label_name(self, label_name: str) -> int:
+        label_idx = self.label_idxs.get(label_name)
+        if label_idx is None:
+            label_idx = len(self.label_names)
+            self.label_names.append(label_name)
+            self.label_idxs[label_name] = label_idx
+        return label_idx
+
+    def get_labeler_idx(self, labeler: str) -> int:
+        if labeler not in self.labeler_list:
+            self.labeler_list.append(labeler)
+        return self.labeler_list.index(labeler)
+
+    def get_row(self, frame_idx: int, create=False) -> int | None:
+        row = self.frame_rows.get(frame_idx)
+        if row is None and create:
+            row = len(self.frame_idxs)
+            self.frame_idxs.append(frame_idx)
+            self.frame_rows[frame_idx] = row
+            if row // self.CHUNK_SIZE >= len(self.chunks):
+                self.chunks.append(self._new_chunk(0))
+        return row
+
+    def _new_chunk(self, n_labels: int) -> Dict[str, np.ndarray]:
+        shape = (n_labels, self.CHUNK_SIZE, self.n_cams)
+        return {
+            'coords': np.full(shape + (2,), np.nan, dtype=np.float64),
+            'point_times': np.zeros(shape, dtype=np.float64),
+            'labeler': np.zeros(shape, dtype=np.uint16),
+            'exists': np.zeros(shape[:2], dtype=bool),
+        }
+
+    def _writable_chunk(self, row: int, label_idx: int) -> Dict[str, np.ndarray]:
+        chunk_idx = row // self.CHUNK_SIZE
+        chunk = self.chunks[chunk_idx]
+        n_chunk_labels = chunk['exists'].shape[0]
+        if label_idx >= n_chunk_labels:
+            n_new = max(label_idx + 1, len(self.label_names)) - n_chunk_labels
+            padding = self._new_chunk(n_new)
+            chunk = {field: np.concatenate((chunk[field], padding[field]), axis=0) for field in self.FIELDS}
+            self.chunks[chunk_idx] = chunk
+        elif chunk_idx in self._shared_chunks:
+            chunk = {field: np.array(chunk[field]) for field in self.FIELDS}
+            self.chunks[chunk_idx] = chunk
+        self._shared_chunks.discard(chunk_idx)
+        return chunk
+
+    def _mark_dirty(self, label_name: str, frame_idx: int):
+        self.generation += 1
+        self.dirty[(label_name, frame_idx)] = self.generation
+
+    def _locate(self, label_name: str, frame_idx: int):
+        """Returns chunk, label index and row offset of an existing entry, None otherwise"""
+        label_idx = self.label_idxs.get(label_name)
+        row = self.frame_rows.get(frame_idx)
+        if label_idx is None or row is None:
+            return None
+        chunk = self.chunks[row // self.CHUNK_SIZE]
+        offset = row % self.CHUNK_SIZE
+        if label_idx >= chunk['exists'].shape[0] or not chunk['exists'][label_idx, offset]:
+            return None
+        return chunk, label_idx, offset
+
+    # Reading
+    def get_label_names(self, allow_empty=False) -> List[str]:
+        """Equivalent of label_lib.get_labels"""
+        if allow_empty:
+            return self.label_names.copy()
+        has_entries = self.get_label_mask()
+        return [ln for ln, has_entry in zip(self.label_names, has_entries) if has_entry]
+
+    def get_label_mask(self) -> np.ndarray:
+        has_entries = np.zeros(len(self.label_names), dtype=bool)
+        for chunk in self.chunks:
+            n_chunk_labels = chunk['exists'].shape[0]
+            has_entries[:n_chunk_labels] |= chunk['exists'].any(axis=1)
+        return has_entries
+
+    def get_labeled_frame_idxs(self, label_name: str | None = None) -> np.ndarray:
+        if label_name is None:
+            return np.array(sorted(self.frame_rows), dtype=int)
+        return np.array([fr_idx for fr_idx in sorted(self.frame_rows) if self.has_entry(label_name, fr_idx)],
+                        dtype=int)
+
+    def has_entry(self, label_name: str, frame_idx: int) -> bool:
+        return self._locate(label_name, frame_idx) is not None
+
+    def get_coords(self, label_name: str, frame_idx: int) -> np.ndarray | None:
+        """Returns the (cams × 2) coordinates of an entry, None if there is no entry"""
+        location = self._locate(label_name, frame_idx)
+        if location is None:
+            return None
+        chunk, label_idx, offset = location
+        return chunk['coords'][label_idx, offset]
+
+    def get_point(self, label_name: str, frame_idx: int, cam_idx: int) -> np.ndarray | None:
+        """Returns the coordinates of a labeled point, None if it is not labeled"""
+        coords = self.get_coords(label_name, frame_idx)
+        if coords is None or np.any(np.isnan(coords[cam_idx])):
+            return None
+        return coords[cam_idx]
+
+    def get_point_time(self, label_name: str, frame_idx: int, cam_idx: int) -> float | None:
+        """Returns the time a point was last set or deleted, None if there is no entry"""
+        location = self._locate(label_name, frame_idx)
+        if location is None:
+            return None
+        chunk, label_idx, offset = location
+        point_time = chunk['point_times'][label_idx, offset, cam_idx]
+        return None if np.isnan(point_time) else float(point_time)
+
+    def get_entry(self, label_name: str, frame_idx: int, label_idx: int | None = None) -> dict | None:
+        """Returns a copy of an entry in bbo.label_lib format, None if there is no entry"""
+        location = self._locate(label_name, frame_idx)
+        if location is None:
+            return None
+        chunk, label_idx, offset = location
+        entry = {
+            'coords': chunk['coords'][label_idx, offset].copy(),
+            'point_times': chunk['point_times'][label_idx, offset].copy(),
+            'labeler': chunk['labeler'][label_idx, offset].copy(),
+        }
+        for field, value in self.extras.get((label_name, frame_idx), {}).items():
+            entry[field] = value.copy() if isinstance(value, np.ndarray) else value
+        return entry
+
+    def get_frame(self, frame_idx: int, field: str = 'coords') -> np.ndarray:
+        """
+        Returns 'field' of all labels on a frame, shaped (labels × cams [× 2]). For a frame with entries for all
+        labels, this is a view into the store.
+        """
+        row = self.frame_rows.get(frame_idx)
+        if row is None:
+            return self._empty_frame(field)
+
+        chunk = self.chunks[row // self.CHUNK_SIZE]
+        data = chunk[field][:, row % self.CHUNK_SIZE]
+        if data.shape[0] < len(self.label_names):
+            padded = self._empty_frame(field)
+            padded[:data.shape[0]] = data
+            data = padded
+        return data
+
+    def _empty_frame(self, field: str) -> np.ndarray:
+        n_labels = len(self.label_names)
+        match field:
+            case 'coords':
+                return np.full((n_labels, self.n_cams, 2), np.nan, dtype=np.float64)
+            case 'point_times':
+                return np.zeros((n_labels, self.n_cams), dtype=np.float64)
+            case 'labeler':
+                return np.zeros((n_labels, self.n_cams), dtype=np.uint16)
+            case 'exists':
+                return np.zeros(n_labels, dtype=bool)
+            case _:
+                raise KeyError(f"Unknown field {field}")
+
+    def get_frame_coords(self, frame_idx: int, cam_idx: int | None = None) -> np.ndarray:
+        """Coordinates of all labels on a frame, (labels × cams × 2), or (labels × 2) for a single camera"""
+        coords = self.get_frame(frame_idx, 'coords')
+        return coords if cam_idx is None else coords[:, cam_idx]
+
+    def get_changes(self, since_generation: int = 0) -> List[tuple]:
+        """
+        (label_name, frame_idx) of all entries that changed after 'since_generation'. Incomplete if 'since_generation'
+        is older than forgotten_generation.
+        """
+        return [key for key, generation in self.dirty.items() if generation > since_generation]
+
+    def forget_changes(self, up_to_generation: int):
+        """Stop tracking changes up to 'up_to_generation', once no one asks for them anymore"""
+        if up_to_generation <= self.forgotten_generation:
+            return
+        self.dirty = {key: generation for key, generation in self.dirty.items() if generation > up_to_generation}
+        self.forgotten_generation = up_to_generation
+
+    def get_labels_from_frame(self, frame_idx: int) -> Dict[str, np.ndarray]:
+        """Equivalent of label_lib.get_labels_from_frame"""
+        coords = self.get_frame(frame_idx, 'coords')
+        labeled = self.get_frame(frame_idx, 'exists') & ~np.all(np.isnan(coords), axis=(1, 2))
+        return {self.label_names[label_idx]: coords[label_idx] for label_idx in np.flatnonzero(labeled)}
+
+    def get_frame_labelers(self, frame_idx: int, cam_idx: int | None = None) -> List[str]:
+        """Equivalent of label_lib.get_frame_labelers"""
+        labeler = self.get_frame(frame_idx, 'labeler')[self.get_frame(frame_idx, 'exists')]
+        if cam_idx is not None:
+            labeler = labeler[:, cam_idx]
+        labelers = [self.labeler_list[i] for i in np.unique(labeler)]
+        if "_unmarked" in labelers:
+            labelers.remove("_unmarked")
+        return labelers
+
+    # Writing
+    def set_entry(self, label_name: str, frame_idx: int, coords, point_times, labeler, **extras):
+        """Create or replace an entire entry"""
+        label_idx = self.add_label_name(label_name)
+        row = self.get_row(frame_idx, create=True)
+        chunk = self._writable_chunk(row, label_idx)
+        offset = row % self.CHUNK_SIZE
+
+        coords = np.asarray(coords, dtype=np.float64)
+        n_cams = min(len(coords), self.n_cams)
+        chunk['coords'][label_idx, offset] = np.nan
+        chunk['coords'][label_idx, offset, :n_cams] = coords[:n_cams]
+        chunk['point_times'][label_idx, offset] = 0
+        chunk['point_times'][label_idx, offset, :n_cams] = np.broadcast_to(point_times, len(coords))[:n_cams]
+        chunk['labeler'][label_idx, offset] = 0
+        chunk['labeler'][label_idx, offset, :n_cams] = np.broadcast_to(labeler, len(coords))[:n_cams]
+        chunk['exists'][label_idx, offset] = True
+
+        if extras:
+            self.extras[(label_name, frame_idx)] = extras
+        else:
+            self.extras.pop((label_name, frame_idx), None)
+        self._mark_dirty(label_name, frame_idx)
+
+    def set_point(self, label_name: str, frame_idx: int, cam_idx: int, coords, point_time: float,
+                  labeler_idx: int):
+        """Set a single point, creating the entry if necessary"""
+        label_idx = self.add_label_name(label_name)
+        row = self.get_row(frame_idx, create=True)
+        chunk = self._writable_chunk(row, label_idx)
+        offset = row % self.CHUNK_SIZE
+
+        chunk['coords'][label_idx, offset, cam_idx] = coords
+        chunk['point_times'][label_idx, offset, cam_idx] = point_time
+        chunk['labeler'][label_idx, offset, cam_idx] = labeler_idx
+        chunk['exists'][label_idx, offset] = True
+        self._mark_dirty(label_name, frame_idx)
+
+    def delete_point(self, label_name: str, frame_idx: int, cam_idx: int, point_time: float,
+                     labeler_idx: int) -> bool:
+        """
+        Delete a labeled point. Deletion time and labeler are recorded, so that the deletion can be synchronized.
+        Returns False if the point was not labeled.
+        """
+        if self.get_point(label_name, frame_idx, cam_idx) is None:
+            return False
+        self.set_point(label_name, frame_idx, cam_idx, np.nan, point_time, labeler_idx)
+        return True
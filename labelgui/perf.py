@@ -0,0 +1,112 @@
+"""
+Timing instrumentation of the hot paths of the GUI.
+
+Disabled by default. enable() wraps the instrumented methods in place, before the GUI is created, so nothing is
+measured, and nothing costs time, unless it is called (`python -m labelgui --profile`).
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bin edges of the histograms in ms, logarithmic from 0.1 ms to 10 s
+HISTOGRAM_EDGES_MS = np.logspace(-1, 4, 11)
+
+# Statistics of the running session, None if instrumentation is disabled
+stats = None
+dump_file: Path | None = None
+
+
+class PerfStats:
+    """Rolling window of the durations of each instrumented call"""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self.durations: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen=self.window)
+                self.counts[name] = 0
+            self.durations[name].append(seconds)
+            self.counts[name] += 1
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            durations = {name: np.array(values) * 1000 for name, values in self.durations.items()}
+            counts = self.counts.copy()
+
+        summary = {}
+        for name, values_ms in durations.items():
+            if not len(values_ms):
+                continue
+            p50, p95, p99 = np.percentile(values_ms, (50, 95, 99))
+            summary[name] = {
+                'n': counts[name],
+                'mean_ms': float(np.mean(values_ms)),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(np.max(values_ms)),
+                'histogram': np.bincount(np.searchsorted(HISTOGRAM_EDGES_MS, values_ms),
+                                         minlength=len(HISTOGRAM_EDGES_MS) + 1).tolist(),
+            }
+        return summary
+
+    def dump(self, file: Path):
+        with open(file, 'w') as fh:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'window': self.window,
+                'histogram_edges_ms': HISTOGRAM_EDGES_MS.tolist(),
+                'stats': self.summary(),
+            }, fh, indent=2)
+
+
+def timed(name: str, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        t_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.record(name, time.perf_counter() - t_start)
+
+    return wrapper
+
+
+def enable(file: Path | None = None, window: int = 1000):
+    """Instrument the hot paths. Has to be called before the MainWindow is created."""
+    global stats, dump_file
+    if stats is not None:
+        return
+    stats = PerfStats(window=window)
+    dump_file = file
+
+    from labelgui.frame_cache import FrameCache
+    from labelgui.ui.main_window import MainWindow
+    from labelgui.ui.sketch_dock import SketchDock
+
+    targets = [
+        (MainWindow, 'set_time'),
+        (MainWindow, 'viewer_update_images'),
+        (MainWindow, 'viewer_plot_labels'),
+        (MainWindow, 'viewer_plot_ref_labels'),
+        (MainWindow, 'save_labels_thread'),
+        (SketchDock, 'update_sketch'),
+        (FrameCache, '_decode'),
+    ]
+    for cls, method_name in targets:
+        setattr(cls, method_name, timed(f"{cls.__name__}.{method_name}", getattr(cls, method_name)))
+    logger.log(logging.INFO, "Performance instrumentation enabled")
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from labelgui.file_cache import get_cache_file, save_cache
+
+logger = logging.getLogger(__name__)
+
+RECORDING_CACHE_VERSION = 1
+
+
+class RecordingCache:
+    """
+    Sidecar of a recording that holds its header, frame dtype and frame times, so that a warm start neither decodes
+    frames to infer them nor parses time files.
+
+    Stored as plain .npz in 'cache_folder', see file_cache. The frame times are additionally keyed by their
+    video_times configuration and the stat of its time file, if any.
+    """
+
+    def __init__(self, cache_folder: Path, recording_file: Path):
+        self.cache_file = get_cache_file(recording_file, cache_folder, RECORDING_CACHE_VERSION)
+        self.header: dict | None = None
+        self.dtype: np.dtype | None = None
+        self.times_key: str | None = None
+        self.times: np.ndarray | None = None
+
+        if self.cache_file.is_file():
+            try:
+                with np.load(self.cache_file, allow_pickle=False) as data:
+                    self.header = json.loads(str(data['header']))
+                    self.dtype = np.dtype(str(data['dtype']))
+                    if 'times' in data:
+                        self.times_key = str(data['times_key'])
+                        self.times = data['times']
+            except Exception as e:
+                logger.log(logging.WARNING, f"Reading recording cache {self.cache_file} failed: {e}")
+                self.header = self.dtype = self.times_key = self.times = None
+
+    @staticmethod
+    def get_times_key(video_times: dict) -> str:
+        video_times = dict(video_times)
+        if 'file' in video_times:
+            stat = os.stat(video_times['file'])
+            video_times['file_stat'] = [stat.st_size, stat.st_mtime_ns]
+        return json.dumps(video_times, sort_keys=True, default=str)
+
+    def get_times(self, times_key: str) -> np.ndarray | None:
+        return self.times if self.times is not None and self.times_key == times_key else None
+
+    def set_meta(self, header: dict, dtype: np.dtype):
+        self.header = header
+        self.dtype = np.dtype(dtype)
+
+    def set_times(self, times_key: str, times: np.ndarray):
+        self.times_key = times_key
+        self.times = np.asarray(times, dtype=np.float64)
+
+    def save(self):
+        arrays = {
+            'header': np.array(json.dumps(self.header, default=_to_json)),
+            'dtype': np.array(self.dtype.str),
+        }
+        if self.times is not None:
+            arrays['times_key'] = np.array(self.times_key)
+            arrays['times'] = self.times
+        save_cache(self.cache_file, **arrays)
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
@@ -0,0 +1,51 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from labelgui.file_cache import get_cache_file, save_cache
+
+logger = logging.getLogger(__name__)
+
+SKETCH_CACHE_FOLDER = Path("~/.bbo_labelgui/sketch_cache").expanduser()
+SKETCH_CACHE_VERSION = 1
+
+
+def load_sketch(file_path, cache_folder: Path | None = SKETCH_CACHE_FOLDER) -> dict:
+    """
+    Load a sketch file as a dict of the uint8 image ('sketch'), the label locations by name ('sketch_label_locations')
+    and their (labels × 2) array ('sketch_label_coordinates').
+
+    Sketch files are pickled .npy dicts with a float image. The prepared arrays are cached as plain .npz in
+    cache_folder, keyed by path, size and modification time of the sketch file, so that reopening a sketch neither
+    unpickles nor converts it. Pass cache_folder=None to bypass the cache.
+    """
+    file_path = Path(file_path)
+    cache_file = get_cache_file(file_path, cache_folder, SKETCH_CACHE_VERSION) if cache_folder is not None else None
+
+    if cache_file is not None and cache_file.is_file():
+        try:
+            with np.load(cache_file, allow_pickle=False) as data:
+                return make_sketch(data['sketch'], data['label_names'].tolist(), data['label_coordinates'])
+        except Exception as e:
+            logger.log(logging.WARNING, f"Reading sketch cache {cache_file} failed: {e}")
+
+    sketch = np.load(file_path.as_posix(), allow_pickle=True)[()]
+    label_locations = sketch['sketch_label_locations']
+    label_names = list(label_locations.keys())
+    label_coordinates = np.array([np.asarray(label_locations[ln], dtype=np.float64)[:2] for ln in label_names],
+                                 dtype=np.float64).reshape(-1, 2)
+    sketch = make_sketch(sketch['sketch'].astype(np.uint8), label_names, label_coordinates)
+
+    if cache_file is not None:
+        save_cache(cache_file, sketch=sketch['sketch'], label_names=np.array(label_names, dtype=str),
+                   label_coordinates=label_coordinates)
+    return sketch
+
+
+def make_sketch(image: np.ndarray, label_names: list, label_coordinates: np.ndarray) -> dict:
+    return {
+        'sketch': image,
+        'sketch_label_locations': dict(zip(label_names, label_coordinates)),
+        'sketch_label_coordinates': label_coordinates,
+    }
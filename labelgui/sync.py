@@ -0,0 +1,278 @@
+"""
+Synchronization of GUIs and viewers over MQTT.
+
+Messages keep their plain payloads, so that peers that only read the payload keep working. Sequence numbers and
+sender ids travel as MQTT v5 user properties. paho is only imported once a connection is created.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from labelgui import trace
+
+logger = logging.getLogger(__name__)
+trace_sync = trace.get_tracer('sync')
+
+
+class MqttConnection:
+    """
+    MQTT client that dispatches incoming messages to a handler per topic.
+
+    Handlers are called from the network thread of the client with the payload and the user properties of the
+    message. 'client' defaults to a paho client; an InProcessBroker client can be passed instead, which does not need
+    paho.
+    """
+
+    def __init__(self, client=None, host: str = "127.0.0.1", port: int = 1883):
+        if client is None:
+            import paho.mqtt.client as mqtt
+            client = mqtt.Client(protocol=mqtt.MQTTv5)
+        self.client = client
+        # Subscribe options and message properties of other clients are plain namespaces with the same attributes
+        self.is_paho = type(client).__module__.startswith('paho.')
+        self.host = host
+        self.port = port
+        self.handlers: Dict[str, Callable[[bytes, Dict[str, str]], None]] = {}
+        self.client.on_message = self._on_message
+
+    def connect(self):
+        self.client.connect(self.host, self.port, 60)
+        self.client.loop_start()
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def subscribe(self, topic: str, handler: Callable[[bytes, Dict[str, str]], None]):
+        self.handlers[topic] = handler
+        # Own messages are not delivered back
+        if self.is_paho:
+            from paho.mqtt.subscribeoptions import SubscribeOptions
+            options = SubscribeOptions(noLocal=True)
+        else:
+            options = SimpleNamespace(noLocal=True)
+        self.client.subscribe(topic, options=options)
+
+    def publish(self, topic: str, payload: str, **user_properties):
+        properties = None
+        if user_properties:
+            user_property = [(key, str(value)) for key, value in user_properties.items()]
+            if self.is_paho:
+                from paho.mqtt.packettypes import PacketTypes
+                from paho.mqtt.properties import Properties
+
+                properties = Properties(PacketTypes.PUBLISH)
+                properties.UserProperty = user_property
+            else:
+                properties = SimpleNamespace(UserProperty=user_property)
+        self.client.publish(topic, payload=payload, properties=properties)
+
+    def _on_message(self, client, userdata, message):
+        handler = self.handlers.get(message.topic)
+        if handler is None:
+            return
+        user_properties = dict(getattr(message.properties, 'UserProperty', None) or [])
+        try:
+            handler(message.payload, user_properties)
+        except Exception as e:
+            logger.log(logging.ERROR, f"Handling MQTT message on {message.topic} failed: {e}")
+
+
+class TimeSync:
+    """
+    Shares the current time with peers on 'topic'.
+
+    Outgoing times are published at most 'max_rate' times per second. A time set within the interval is published at
+    its end (trailing edge), so peers always receive the final time. Incoming messages that are older than the last
+    one of their sender are dropped, and only the newest incoming time is kept until take_pending is called.
+    'on_time' is called once when a time becomes pending, on the network thread.
+
+    'clock' and 'timer_class' (with the interface of threading.Timer) can be replaced, e.g. to test the rate limit
+    without waiting.
+    """
+
+    def __init__(self, connection: MqttConnection, topic: str, on_time: Callable[[], None], max_rate: float = 30,
+                 clock: Callable[[], float] = time.monotonic, timer_class=threading.Timer):
+        self.connection = connection
+        self.topic = topic
+        self.on_time = on_time
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.sender = uuid.uuid4().hex[:12]
+        self.clock = clock
+        self.timer_class = timer_class
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._last_publish = -float('inf')
+        self._outgoing_time: float | None = None
+        self._timer: threading.Timer | None = None
+        self._incoming_time: float | None = None
+        self._last_seqs: Dict[str, int] = {}
+
+        connection.subscribe(topic, self._on_message)
+
+    def publish(self, t: float):
+        with self._lock:
+            self._outgoing_time = t
+            if self._timer is not None:
+                # Sent by the pending timer
+                return
+            wait = self._last_publish + self.min_interval - self.clock()
+            if wait > 0:
+                self._timer = self.timer_class(wait, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self._flush()
+
+    def take_pending(self) -> float | None:
+        with self._lock:
+            t = self._incoming_time
+            self._incoming_time = None
+        return t
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            t = self._outgoing_time
+            self._outgoing_time = None
+            if t is None:
+                return
+            self._seq += 1
+            seq = self._seq
+            self._last_publish = self.clock()
+        self.connection.publish(self.topic, str(t), seq=seq, sender=self.sender)
+
+    def _on_message(self, payload: bytes, user_properties: Dict[str, str]):
+        try:
+            t = float(payload.decode())
+        except ValueError:
+            logger.log(logging.WARNING, f"Invalid time {payload!r} on {self.topic}")
+            return
+
+        sender = user_properties.get('sender')
+        seq = user_properties.get('seq')
+        with self._lock:
+            # Messages without sequence number are always accepted
+            if sender is not None and seq is not None:
+                seq = int(seq)
+                if seq <= self._last_seqs.get(sender, 0):
+                    if trace_sync.enabled:
+                        trace_sync.log(logging.DEBUG, "Dropped out-of-order time %s (%s #%s)", t, sender, seq)
+                    return
+                self._last_seqs[sender] = seq
+            notify = self._incoming_time is None
+            self._incoming_time = t
+        if trace_sync.enabled:
+            trace_sync.log(logging.DEBUG, "Received time %s (%s #%s)", t, sender, seq)
+        if notify:
+            self.on_time()
+
+
+class LabelSync:
+    """
+    Streams label edits to peers on 'topic', one message per edited point in the record format of LabelJournal.
+
+    Incoming records are queued until take_pending is called; 'on_records' is called once when the queue becomes
+    non-empty, on the network thread. Conflicts are resolved by the receiver, see LabelJournal.apply_record.
+    """
+
+    def __init__(self, connection: MqttConnection, topic: str, on_records: Callable[[], None]):
+        self.connection = connection
+        self.topic = topic
+        self.on_records = on_records
+        self.sender = uuid.uuid4().hex[:12]
+
+        self._lock = threading.Lock()
+        self._pending_records: List[dict] = []
+
+        connection.subscribe(topic, self._on_message)
+
+    def publish(self, record: dict):
+        self.connection.publish(self.topic, json.dumps(record), sender=self.sender)
+
+    def take_pending(self) -> List[dict]:
+        with self._lock:
+            records = self._pending_records
+            self._pending_records = []
+        return records
+
+    def _on_message(self, payload: bytes, user_properties: Dict[str, str]):
+        try:
+            record = json.loads(payload)
+            record = {
+                'label': str(record['label']),
+                'frame': int(record['frame']),
+                'cam': int(record['cam']),
+                'coords': None if record['coords'] is None else [float(c) for c in record['coords'][:2]],
+                'point_time': float(record['point_time']),
+                'labeler': str(record['labeler']),
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            logger.log(logging.WARNING, f"Invalid label record on {self.topic}: {e}")
+            return
+
+        with self._lock:
+            notify = not self._pending_records
+            self._pending_records.append(record)
+        if trace_sync.enabled:
+            trace_sync.log(logging.DEBUG, "Received label record %s", record)
+        if notify:
+            self.on_records()
+
+
+class InProcessBroker:
+    """Stands in for an MQTT broker, delivering messages between its clients synchronously"""
+
+    def __init__(self):
+        self.clients = []
+
+    def client(self):
+        client = InProcessClient(self)
+        self.clients.append(client)
+        return client
+
+
+class InProcessClient:
+    """The subset of the paho client interface used by MqttConnection, without wildcard topics"""
+
+    def __init__(self, broker: InProcessBroker):
+        self.broker = broker
+        self.on_message = None
+        self.subscriptions = {}
+
+    def connect(self, host, port, keepalive=60):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.broker.clients.remove(self)
+
+    def subscribe(self, topic, options=None):
+        self.subscriptions[topic] = options
+
+    def publish(self, topic, payload=None, properties=None):
+        message = SimpleNamespace(topic=topic, payload=payload.encode() if isinstance(payload, str) else payload,
+                                  properties=properties)
+        for client in list(self.broker.clients):
+            if topic not in client.subscriptions or client.on_message is None:
+                continue
+            options = client.subscriptions[topic]
+            if client is self and options is not None and options.noLocal:
+                continue
+            client.on_message(client, None, message)
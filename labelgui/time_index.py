@@ -0,0 +1,76 @@
+from typing import List
+
+import numpy as np
+
+
+class TimeIndex:
+    """
+    Sorted index of all valid timepoints and of the frame times of each camera.
+
+    Built once on load; all lookups are binary searches, so navigation cost does not depend on recording length.
+    """
+
+    def __init__(self, cam_times: List[np.ndarray], min_time: float = -np.inf, max_time: float = np.inf):
+        self.cam_times = [np.asarray(ct, dtype=np.float64) for ct in cam_times]
+
+        # Frame times are normally monotonic, only keep a sort order for cameras where they are not
+        self._cam_sorted_times = []
+        self._cam_sort_order = []
+        for ct in self.cam_times:
+            if len(ct) < 2 or np.all(ct[1:] >= ct[:-1]):
+                self._cam_sorted_times.append(ct)
+                self._cam_sort_order.append(None)
+            else:
+                order = np.argsort(ct, kind='stable')
+                self._cam_sorted_times.append(ct[order])
+                self._cam_sort_order.append(order)
+
+        if len(self.cam_times):
+            times = np.unique(np.concatenate(self.cam_times))
+        else:
+            times = np.zeros(0, dtype=np.float64)
+        self.times = times[(times >= min_time) & (times < max_time)]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, time_idx: int) -> float:
+        return float(self.times[time_idx])
+
+    def __contains__(self, input_time: float) -> bool:
+        return self.index(input_time) is not None
+
+    def index(self, input_time: float) -> int | None:
+        """Returns the index of 'input_time' in the valid timepoints, None if it is not a valid timepoint"""
+        time_idx = int(np.searchsorted(self.times, input_time, side='left'))
+        if time_idx < len(self.times) and self.times[time_idx] == input_time:
+            return time_idx
+        return None
+
+    def nearest_index(self, input_time: float, reference_idx: int | None = None) -> int:
+        """
+        Returns the index of the valid timepoint closest to 'input_time'.
+        Ties are resolved towards the timepoint at 'reference_idx'.
+        """
+        time_idx = int(np.searchsorted(self.times, input_time, side='left'))
+        if time_idx == 0:
+            return 0
+        if time_idx == len(self.times):
+            return len(self.times) - 1
+
+        d_lower = input_time - self.times[time_idx - 1]
+        d_upper = self.times[time_idx] - input_time
+        if d_lower < d_upper or (d_lower == d_upper and (reference_idx is None or reference_idx < time_idx)):
+            return time_idx - 1
+        return time_idx
+
+    def nearest_frame(self, cam_idx: int, input_time: float) -> int:
+        """Returns the frame index of camera 'cam_idx' whose frame time is closest to 'input_time'"""
+        sorted_times = self._cam_sorted_times[cam_idx]
+        pos = int(np.searchsorted(sorted_times, input_time, side='left'))
+        if pos == len(sorted_times) or \
+                (pos > 0 and input_time - sorted_times[pos - 1] <= sorted_times[pos] - input_time):
+            pos -= 1
+
+        sort_order = self._cam_sort_order[cam_idx]
+        return pos if sort_order is None else int(sort_order[pos])
@@ -0,0 +1,63 @@
+"""
+Diagnostic tracing of the hot paths, per subsystem.
+
+Tracers are disabled by default. Call sites check `tracer.enabled` before building any message, and messages are
+formatted lazily by logging, so a disabled tracer costs one attribute lookup. Enable with
+`python -m labelgui --trace render:debug@10,decode`, i.e. a comma separated list of SUBSYSTEM[:LEVEL][@N], where
+only every Nth event of a subsystem is emitted.
+"""
+import logging
+from typing import Dict
+
+SUBSYSTEMS = ('render', 'decode', 'sync')
+
+
+class Tracer:
+    def __init__(self, subsystem: str):
+        self.subsystem = subsystem
+        self.logger = logging.getLogger(f"labelgui.trace.{subsystem}")
+        self.enabled = False
+        self.level = logging.DEBUG
+        self.sample_every = 1
+        self._count = 0
+
+    def configure(self, level: int = logging.DEBUG, sample_every: int = 1):
+        self.level = level
+        self.sample_every = max(1, int(sample_every))
+        self._count = 0
+        self.logger.setLevel(level)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def log(self, level: int, msg: str, *args):
+        """Emits msg % args, if the tracer is enabled for level and the event is sampled"""
+        if not self.enabled or level < self.level:
+            return
+        self._count += 1
+        if self._count % self.sample_every:
+            return
+        self.logger.log(level, msg, *args)
+
+
+_tracers: Dict[str, Tracer] = {subsystem: Tracer(subsystem) for subsystem in SUBSYSTEMS}
+
+
+def get_tracer(subsystem: str) -> Tracer:
+    if subsystem not in _tracers:
+        raise ValueError(f"Unknown trace subsystem {subsystem}, use one of {SUBSYSTEMS}")
+    return _tracers[subsystem]
+
+
+def configure(spec: str):
+    """Enables the tracers given as SUBSYSTEM[:LEVEL][@N],... ('all' enables every subsystem)"""
+    for entry in filter(None, (entry.strip() for entry in spec.split(','))):
+        entry, _, sample_every = entry.partition('@')
+        subsystem, _, level_name = entry.partition(':')
+        level = logging.getLevelName(level_name.upper()) if level_name else logging.DEBUG
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown trace level {level_name}")
+        subsystems = SUBSYSTEMS if subsystem == 'all' else [subsystem]
+        for subsystem in subsystems:
+            get_tracer(subsystem).configure(level, int(sample_every) if sample_every else 1)
@@ -1,4 +1,6 @@
 from .controls_dock import ControlsDock
 from .main_window import MainWindow
+from .navigation_scheduler import NavigationScheduler
+from .perf_dock import PerfDock
 from .sketch_dock import SketchDock
 from .viewer_sub_window import ViewerSubWindow
@@ -8,55 +8,92 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-import paho.mqtt.client as mqtt
-import pandas as pd
-import svidreader
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtWidgets import QMdiArea, \
     QFileDialog, \
-    QMainWindow
-from bbo import label_lib, path_management as bbo_pm
-from paho.mqtt.subscribeoptions import SubscribeOptions
+    QMainWindow, \
+    QMessageBox, \
+    QProgressBar
+from bbo import path_management as bbo_pm
 
 from labelgui import misc as labelgui_misc
+from labelgui.frame_cache import FrameCache, FramePrefetcher, ParallelDecoder, open_reader
+from labelgui.label_guess import LabelGuesser
+from labelgui.label_journal import LabelJournal
+from labelgui import label_io
+from labelgui import perf
+from labelgui import trace
+from labelgui.label_store import LabelStore
+from labelgui.recording_cache import RecordingCache
 from labelgui.select_user import SelectUserWindow
+from labelgui.sync import LabelSync, MqttConnection, TimeSync
+from labelgui.time_index import TimeIndex
 from .controls_dock import ControlsDock
+from .navigation_scheduler import NavigationScheduler
+from .perf_dock import PerfDock
 from .sketch_dock import SketchDock
 from .viewer_sub_window import ViewerSubWindow
 
 logger = logging.getLogger(__name__)
+trace_render = trace.get_tracer('render')
 
 
 class MainWindow(QMainWindow):
-    mqtt_message_signal = pyqtSignal(float)
-
-    def __init__(self, drive: Path, file_config=None, parent=None, sync: str | bool = False):
+    # Emitted from the MQTT thread when a time of a peer is pending in time_sync
+    sync_time_signal = pyqtSignal()
+    # Emitted from the MQTT thread when label edits of peers are pending in label_sync
+    sync_labels_signal = pyqtSignal()
+    # Emitted from loader threads with the name, result and exception of a finished load stage
+    load_stage_signal = pyqtSignal(str, object, object)
+    session_loaded_signal = pyqtSignal()
+
+    def __init__(self, drive: Path, file_config=None, parent=None, sync: str | bool = False, user: str | None = None):
         super(MainWindow, self).__init__(parent)
 
         self.save_thread = ThreadPoolExecutor(max_workers=1)
+        # Snapshots waiting to be written by save_thread, by file. A file is queued at most once.
+        self.pending_saves: Dict[Path, tuple] = {}
+        self.pending_saves_lock = threading.Lock()
+        # Generation of self.labels at the last successful save, by file
+        self.saved_generations: Dict[Path, int] = {}
 
         self.user = None
         self.drive = drive
         self.cfg = {}
         self.file_config = None
-        self.mqtt_client = None
+        self.mqtt_connection: MqttConnection | None = None
+        self.time_sync: TimeSync | None = None
+        self.label_sync: LabelSync | None = None
         self.sync = sync
 
-        self.cameras: List[Dict] = []
+        self.cameras: List[Dict | None] = []
         self.subwindows: Dict = {}
-        self.labels = label_lib.get_empty_labels()
-        self.ref_labels = label_lib.get_empty_labels()
+        # Cameras whose subwindow was hidden while its frame or labels changed, they are redrawn once shown
+        self.stale_cam_idxs = set()
+        self.labels = LabelStore(n_cams=0)
+        self.ref_labels = LabelStore(n_cams=0)
+        self.label_journal: LabelJournal | None = None
+        self.label_guesser = LabelGuesser(self.labels)
+        self.labels_file: Path | None = None
         self.neighbor_points = {}
         self.auto_save_counter = 0
+        self.frame_prefetcher = None
+        self.frame_decoder = None
+        # Coalesces repeating navigation input (held A/D keys, mouse wheel)
+        self.navigation_scheduler = NavigationScheduler(self.set_time, parent=self)
 
         # Docks
         self.mdi = QMdiArea()
         self.dock_sketch = SketchDock()
         self.dock_controls = ControlsDock()
+        # Only exists when instrumentation is enabled (--profile)
+        self.dock_perf = PerfDock(perf.stats) if perf.stats is not None else None
 
         # Menus
         self.session_menu = self.menuBar().addMenu("&File")
-        self.session_menu.addAction("Save Labels As...", self.save_labels_as)
+        self.action_save_labels_as = self.session_menu.addAction("Save Labels As...", self.save_labels_as)
+        # Enabled once the session is loaded
+        self.action_save_labels_as.setEnabled(False)
 
         self.view_menu = self.menuBar().addMenu("&View")
         self.view_menu.addAction("&Tab (single cam view)", lambda: self.mdi_view_select("tab_view"))
@@ -64,20 +101,27 @@ class MainWindow(QMainWindow):
         self.view_menu.addAction("&Cascade", lambda: self.mdi_view_select("cascade_view"))
 
         self.view_menu.addSection("Reference labels")
-        self.checkbox_disp_ref_annotated = self.view_menu.addAction("&Only Display Annotated", self.viewer_change_frame)
+        self.checkbox_disp_ref_annotated = self.view_menu.addAction("&Only Display Annotated",
+                                                                 self.ref_labels_display_changed)
         self.checkbox_disp_ref_annotated.setCheckable(True)
         self.checkbox_disp_ref_annotated.setChecked(True)
+        self.checkbox_disp_ref_annotated.setEnabled(False)
+
+        if self.dock_perf is not None:
+            self.view_menu.addSection("Profiling")
+            self.view_menu.addAction(self.dock_perf.toggleViewAction())
 
         # Config
-        self.load_cfg()
+        self.load_cfg(file_config=file_config, user=user)
 
         # Load some params from config
         self.d_time = self.cfg['d_time']
         self.min_time = int(self.cfg['min_time'])
         self.max_time = int(self.cfg['max_time'])
         self.current_time = None
-        self.times = []
-        self.cam_times = []
+        self.current_time_idx = None
+        self.time_direction = 1  # Direction of the last time step, used to guess which frames to prefetch
+        self.time_index: TimeIndex | None = None
         self.dock_sketch.sketch_zoom_scale = self.cfg.get('sketch_zoom_scale', 0.1)
 
         # Files
@@ -89,15 +133,136 @@ class MainWindow(QMainWindow):
         self.recordings_loaded = False
         self.labels_loaded = False
         self.gui_loaded = False
+        self.load_executor: ThreadPoolExecutor | None = None
+        self.load_stages = {}  # Stage name -> loader
+        self.pending_load_stages = set()  # Stages that did not succeed yet
+        self.running_load_stages = set()
+        self.failed_load_stages = {}  # Stage name -> error of the current attempt
+        self.load_error: Exception | None = None
+
+        # GUI layout, shown while the session loads
+        self.setCentralWidget(self.mdi)
+        self.mdi.setViewMode(QMdiArea.TabbedView)
+        self.set_docks_layout()
+        self.load_progress = QProgressBar()
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.showMaximized()
+        self.setFocus()
+        self.setWindowTitle(f"Labeling GUI - {self.dataset_name}")
 
         # Loaded data
         self.init_files_folders()
         self.dock_sketch.load_sketches(sketch_files=[Path(file)
                                                      for file in self.cfg['sketch_files']])
+        self.start_loading()
 
+    # Init functions
+    def init_files_folders(self):
+        # create folder structure / save backup
+        self.init_assistant_folders(Path(self.cfg['recording_folder']))
+        self.init_autosave()
+
+    def get_recording_files(self) -> List[Path]:
+        recording_folder = Path(self.cfg['recording_folder'])
+        return [bbo_pm.decode_path(recording_folder / i).expanduser().resolve() for i in
+                self.cfg['recording_filenames']]
+
+    def start_loading(self):
+        """
+        Open the recordings, labels, reference labels and the first sketch concurrently.
+
+        Each stage runs in load_executor and reports to load_stage_finished on the GUI thread. Subwindows are created
+        as their recordings are opened, the session is completed in finish_loading once all stages are done. Until
+        then, labels and sketches are only accessed by their loader.
+        """
+        rec_files = self.get_recording_files()
+        self.cameras = [None] * len(rec_files)
+
+        stages = {f'recording {cam_idx}': lambda file=file: self.load_recording(file)
+                  for cam_idx, file in enumerate(rec_files)}
         load_labels_file = self.cfg["load_labels_file"]
-        self.load_labels(labels_file=Path(load_labels_file) if isinstance(load_labels_file, str) else None)
-        self.load_ref_labels()
+        stages['labels'] = lambda: self.load_labels(
+            labels_file=Path(load_labels_file) if isinstance(load_labels_file, str) else None)
+        stages['reference labels'] = self.load_ref_labels
+        if self.dock_sketch.sketches_loaded:
+            stages['sketch'] = self.dock_sketch.get_sketch
+
+        self.load_stages = stages
+        self.pending_load_stages = set(stages)
+        self.load_progress.setRange(0, len(stages))
+        self.load_progress.setValue(0)
+        self.load_stage_signal.connect(self.load_stage_finished)
+
+        self.load_executor = ThreadPoolExecutor(max_workers=self.cfg.get('load_workers', len(stages)))
+        self.submit_load_stages(stages)
+
+    def submit_load_stages(self, stages):
+        self.statusBar().showMessage("Loading session...")
+        for stage in stages:
+            self.running_load_stages.add(stage)
+            self.load_executor.submit(self.run_load_stage, stage, self.load_stages[stage])
+
+    def run_load_stage(self, stage: str, load):
+        try:
+            result, error = load(), None
+        except Exception as e:
+            result, error = None, e
+        self.load_stage_signal.emit(stage, result, error)
+
+    def load_stage_finished(self, stage: str, result, error: Exception | None):
+        self.running_load_stages.discard(stage)
+        if error is not None:
+            # The other stages finish, so that a retry only repeats the failed ones
+            if self.load_error is None:
+                self.load_error = error
+            self.failed_load_stages[stage] = error
+            logger.log(logging.ERROR, f"Loading {stage} failed: {error}")
+            self.statusBar().showMessage(f"Loading {stage} failed: {error}")
+        elif stage.startswith('recording'):
+            self.cameras[int(stage.split()[-1])] = result
+            # Subwindows are created in camera order, as soon as all preceding recordings are open
+            for cam_idx, cam in enumerate(self.cameras):
+                if cam is None:
+                    break
+                if cam_idx in self.cfg['allowed_cams'] and cam_idx not in self.subwindows:
+                    self.init_subwindow(cam_idx)
+
+        if error is None:
+            self.pending_load_stages.discard(stage)
+            self.load_progress.setValue(self.load_progress.maximum() - len(self.pending_load_stages))
+        if self.running_load_stages:
+            return
+        if self.failed_load_stages:
+            self.load_failed()
+        elif not self.pending_load_stages:
+            self.finish_loading()
+
+    def load_failed(self):
+        """Report the failed stages and let the user retry them or close the session"""
+        message = "\n".join(f"{stage}: {error}" for stage, error in self.failed_load_stages.items())
+        box = QMessageBox(QMessageBox.Critical, "Loading failed", f"Loading the session failed:\n{message}",
+                          QMessageBox.Retry | QMessageBox.Close, self)
+        box.setWindowModality(Qt.WindowModal)
+        box.finished.connect(self.load_failed_answered)
+        # Not blocking, the status stays observable (load_error) while the box is open
+        box.open()
+
+    def load_failed_answered(self, button: int):
+        if button == QMessageBox.Retry:
+            stages = list(self.failed_load_stages)
+            logger.log(logging.INFO, f"Retrying to load {', '.join(stages)}")
+            self.failed_load_stages = {}
+            self.load_error = None
+            self.submit_load_stages(stages)
+        else:
+            self.close()
+
+    def finish_loading(self):
+        self.load_executor.shutdown(wait=False)
+        self.recordings_loaded = True
+        self.load_times()
+        # load last frame
+        self.restore_last_frame_time()
 
         self.dock_sketch.init_sketch()
         self.init_viewer()
@@ -105,32 +270,20 @@ class MainWindow(QMainWindow):
         self.connect_controls()
         self.mqtt_connect()
 
-        # GUI layout
-        self.setCentralWidget(self.mdi)
-        self.set_docks_layout()
-        self.showMaximized()
-        self.setFocus()
-        self.setWindowTitle(f"Labeling GUI - {self.dataset_name}")
-
+        self.load_progress.hide()
+        self.statusBar().clearMessage()
+        self.action_save_labels_as.setEnabled(True)
+        self.checkbox_disp_ref_annotated.setEnabled(True)
         self.gui_loaded = True
-
-    # Init functions
-    def init_files_folders(self):
-        recording_folder = Path(self.cfg['recording_folder'])
-        rec_files = (
-            [bbo_pm.decode_path(recording_folder / i).expanduser().resolve() for i in
-             self.cfg['recording_filenames']]
-        )
-        self.load_recordings(rec_files)
-        self.load_times()
-
-        # create folder structure / save backup / load last frame
-        self.init_assistant_folders(recording_folder)
-        self.init_autosave()
-        self.restore_last_frame_time()
-
-    def load_cfg(self):
-        if os.path.isdir(self.drive):
+        self.session_loaded_signal.emit()
+
+    def load_cfg(self, file_config: Path | None = None, user: str | None = None):
+        if file_config is not None and user is not None:
+            # Config and user are given, e.g. for benchmarks, no user selection
+            self.user = user
+            file_config = Path(file_config)
+            self.cfg = labelgui_misc.load_cfg(file_config)
+        elif os.path.isdir(self.drive):
             self.user, job, correct_exit = SelectUserWindow.start(self.drive)
             if correct_exit:
                 file_loc = self.drive / 'data' / 'user' / self.user
@@ -154,62 +307,109 @@ class MainWindow(QMainWindow):
 
     def load_labels(self, labels_file: Optional[Path] = None):
         if labels_file is None:
-            labels_file = self.labels_folder / 'labels.yml'
+            binary_file = self.labels_folder / f'labels{label_io.BINARY_SUFFIX}'
+            yml_file = self.labels_folder / 'labels.yml'
+            labels_file = binary_file if binary_file.exists() else yml_file
+            if binary_file.exists() and yml_file.exists():
+                # E.g. a yml file written by a CLI merge into a binary session, the newer file wins
+                if yml_file.stat().st_mtime > binary_file.stat().st_mtime:
+                    labels_file = yml_file
+                logger.log(logging.WARNING, f"Found {binary_file.name} and {yml_file.name}, "
+                                            f"loading the newer {labels_file.name}")
+        # Labels are saved in the format they were loaded in
+        self.labels_file = self.labels_folder / \
+            f"labels{label_io.BINARY_SUFFIX if label_io.is_binary(labels_file) else '.yml'}"
 
         if labels_file.exists():
             logger.log(logging.INFO, f'Loading labels from: {labels_file}')
-            self.labels = label_lib.load(labels_file, v0_format=False)
+            self.labels = label_io.load(labels_file, n_cams=len(self.cfg['recording_filenames']))
             self.labels_loaded = True
 
             # Backing up the labels file after reading/loading it. Correct loading -> file 'healthy' -> back it up
             backup_folder = self.labels_folder / 'backup'
             labelgui_misc.copy_file(labels_file, backup_folder)
+
+            if labels_file.expanduser().resolve() == self.labels_file.expanduser().resolve():
+                self.saved_generations[self.labels_file.expanduser().resolve()] = self.labels.generation
         else:
             logger.log(logging.WARNING, f'Autoloading failed. Labels file {labels_file} does not exist.')
+            self.labels = LabelStore(n_cams=len(self.cfg['recording_filenames']))
+
+        self.init_label_journal()
+        self.label_guesser = LabelGuesser(self.labels, strategy=self.cfg.get('guess_strategy', 'symmetric'),
+                                          window=self.cfg.get('guess_window', 3))
+
+    def init_label_journal(self):
+        """Replay edits that were journaled, but not yet saved to the labels file, e.g. due to a crash"""
+        if not self.cfg.get('label_journal', True):
+            return
+
+        self.label_journal = LabelJournal(self.labels_file)
+        n_records = self.label_journal.replay(self.labels)
+        if n_records:
+            logger.log(logging.INFO, f'Replayed {n_records} label edits from journal '
+                                     f'{self.label_journal.journal_file.as_posix()}')
 
     def load_ref_labels(self):
         ref_labels_file = self.cfg['reference_labels_file']
         if isinstance(ref_labels_file, bool) and ref_labels_file:
             self.cfg[
                 'reference_labels_file'] = ref_labels_file = self.drive / "data" / "references" / f"{self.dataset_name}.yml"
+            if ref_labels_file.with_suffix(label_io.BINARY_SUFFIX).is_file():
+                ref_labels_file = ref_labels_file.with_suffix(label_io.BINARY_SUFFIX)
         elif isinstance(ref_labels_file, str):
             ref_labels_file = Path(ref_labels_file)
         else:
             return
 
         if ref_labels_file.is_file():
-            self.ref_labels = label_lib.load(ref_labels_file, v0_format=False)
+            self.ref_labels = label_io.load(ref_labels_file, n_cams=len(self.cfg['recording_filenames']))
         else:
             logger.log(logging.WARNING, f" Not Found: reference labels file {ref_labels_file.as_posix()} ")
 
-    def load_recordings(self, files: List[Path]):
-        cameras = []
-        logger.log(logging.DEBUG, svidreader.__file__)
-        for file in files:
-            logger.log(logging.INFO, f"File name: {file.as_posix()}")
-            reader = svidreader.get_reader(file.as_posix(), backend="iio", cache=True)
-            header = labelgui_misc.read_video_meta(reader)
-            cam = {
-                'file_name': file.name,
-                'reader': reader,
-                'header': header,
-                'x_lim_prev': (0, header['sensorsize'][0]),
-                'y_lim_prev': (0, header['sensorsize'][1]),
-                'rotate': False,
-            }
-            cameras.append(cam)
-
-        self.recordings_loaded = True
-        self.cameras = cameras
+    def load_recording(self, file: Path) -> dict:
+        logger.log(logging.INFO, f"File name: {file.as_posix()}")
+        reader = open_reader(file.as_posix())
+        frame_cache = FrameCache(reader, max_bytes=int(self.cfg.get('frame_cache_mb', 256) * 1024 ** 2),
+                                 source=file.as_posix())
+        # Header and dtype are only inferred from decoded frames if they are not cached yet
+        recording_cache = RecordingCache(self.labels_folder / 'cache', file)
+        if recording_cache.header is None:
+            recording_cache.set_meta(labelgui_misc.read_video_meta(reader), frame_cache.get(0).dtype)
+            recording_cache.save()
+        header = recording_cache.header
+        cam = {
+            'file_name': file.name,
+            'reader': reader,
+            'frame_cache': frame_cache,
+            'recording_cache': recording_cache,
+            'header': header,
+            'dtype': recording_cache.dtype,
+            'x_lim_prev': (0, header['sensorsize'][0]),
+            'y_lim_prev': (0, header['sensorsize'][1]),
+            'rotate': False,
+        }
+        # The subwindow previews the first frame while the session loads, decoded here off the GUI thread
+        frame_cache.get(0)
+        return cam
 
     def load_times(self):
         if self.recordings_loaded:
             num_frames = self.get_n_frames()
 
+            cam_times_list = []
             for cam_idx, cam in enumerate(self.cameras):
                 video_times_dict = self.cfg["video_times"].get(cam_idx, {})
+                recording_cache = cam['recording_cache']
+                times_key = RecordingCache.get_times_key(video_times_dict)
+                cam_times = recording_cache.get_times(times_key)
+                if cam_times is not None:
+                    cam_times_list.append(cam_times)
+                    continue
+
                 if 'file' in video_times_dict:
                     # TODO: Needs testing
+                    import pandas as pd
                     times_pd = pd.read_csv(video_times_dict['file'], comment="#")
                     cam_times = np.array(times_pd.iloc[:, 0]).astype(float)  # Loading times from first column
                     assert len(cam_times) == num_frames[cam_idx], (f"video times in the csv file "
@@ -218,23 +418,24 @@ class MainWindow(QMainWindow):
                     cam_times = np.arange(num_frames[cam_idx]) / video_times_dict.get('fps',
                                                                                       cam['header']['fps'])
                 cam_times += video_times_dict.get('offset', 0)
-                self.cam_times.append(list(cam_times))
+                cam_times_list.append(cam_times)
+                recording_cache.set_times(times_key, cam_times)
+                recording_cache.save()
 
-            # Concatenate and remove duplicates
-            times = set(sum(self.cam_times, []))
-            times = np.asarray(sorted(times))
-            times = times[(times >= self.min_time) & (times < self.max_time)]
-            logger.log(logging.INFO, f"{len(times)} VALID TIMEPOINTS SELECTED")
-            self.times = times.tolist()
-            self.current_time = self.times[0]
+            self.time_index = TimeIndex(cam_times_list, min_time=self.min_time, max_time=self.max_time)
+            logger.log(logging.INFO, f"{len(self.time_index)} VALID TIMEPOINTS SELECTED")
+            self.current_time = self.time_index[0]
+            self.current_time_idx = 0
 
     def restore_last_frame_time(self):
         # Retrieve last frame from 'exit' file
         file_exit_status = self.labels_folder / 'exit_status.npy'
         if file_exit_status.is_file():
             exit_status = np.load(file_exit_status.as_posix(), allow_pickle=True)[()]
-            if exit_status.get('i_time', self.times[0]) in self.times:
-                self.current_time = exit_status.get('i_time', self.times[0])
+            last_time_idx = self.time_index.index(exit_status.get('i_time', self.time_index[0]))
+            if last_time_idx is not None:
+                self.current_time = self.time_index[last_time_idx]
+                self.current_time_idx = last_time_idx
 
     def init_assistant_folders(self, recording_folder: Path):
         # folder structure
@@ -259,19 +460,30 @@ class MainWindow(QMainWindow):
             os.makedirs(autosave_folder)
 
     # Init gui functions
-    def init_viewer(self):
-
-        # Open windows
-        for cam_idx, cam in enumerate(self.cameras):
-            if cam_idx in self.cfg['allowed_cams']:
-                window = ViewerSubWindow(index=cam_idx,
-                                         reader=cam['reader'],
-                                         parent=self.mdi)
-                window.setWindowTitle(f"{cam['file_name']} ({cam_idx})")
-                window.redraw_frame()
-                self.subwindows[cam_idx] = window
+    def init_subwindow(self, cam_idx: int):
+        cam = self.cameras[cam_idx]
+        window = ViewerSubWindow(index=cam_idx,
+                                 reader=cam['reader'],
+                                 frame_cache=cam['frame_cache'],
+                                 display_pyramid=self.cfg.get('display_pyramid', True),
+                                 dtype=cam['dtype'],
+                                 parent=self.mdi)
+        window.setWindowTitle(f"{cam['file_name']} ({cam_idx})")
+        # Until the time index is known, the first frame is shown
+        window.frame_idx = 0
+        window.redraw_frame()
+        window.show()
+        self.subwindows[cam_idx] = window
 
-        self.mdi.setViewMode(QMdiArea.TabbedView)
+    def init_viewer(self):
+        self.frame_prefetcher = FramePrefetcher(max_workers=self.cfg.get('prefetch_workers', len(self.subwindows)))
+        self.frame_decoder = ParallelDecoder(max_workers=self.cfg.get('decode_workers', len(self.subwindows)),
+                                             use_processes=self.cfg.get('decode_processes', False))
+        # Subwindows show their first frame while loading, all are redrawn at the restored time
+        for subwin in self.subwindows.values():
+            subwin.frame_idx = None
+        if self.subwindows:
+            self.mdi.setActiveSubWindow(next(iter(self.subwindows.values())))
         self.set_time(self.current_time, time_field_update=False)
 
     def fill_controls(self):
@@ -327,113 +539,156 @@ class MainWindow(QMainWindow):
             subwin.connect_controls()
             subwin.mouse_clicked_signal.connect(self.viewer_click)
             subwin.view_box.mouse_wheel_signal.connect(self.viewer_wheel_event)
+        self.mdi.subWindowActivated.connect(lambda _: self.viewer_update_stale())
 
         # mqtt
-        self.mqtt_message_signal.connect(lambda x: self.set_time(x, mqtt_publish=False))
+        self.sync_time_signal.connect(self.sync_time_received)
+        self.sync_labels_signal.connect(self.sync_labels_received)
 
     # Viewer functions
-    def viewer_change_frame(self):
+    def ref_labels_display_changed(self):
+        if not self.gui_loaded:
+            return
+        self.viewer_change_frame()
+
+    def viewer_change_frame(self, cam_idxs=None):
+        """Redraw images and overlays of the given cameras (defaults to all), keeping the existing overlay items"""
         self.trigger_autosave_event()
-        self.viewer_clear_labels()
 
-        self.viewer_update_images()
-        self.viewer_plot_labels()
-        self.viewer_plot_ref_labels()
+        self.viewer_update_images(cam_idxs=cam_idxs)
+        self.viewer_plot_labels(cam_idxs=cam_idxs)
+        self.viewer_plot_ref_labels(cam_idxs=cam_idxs)
 
-    def viewer_update_images(self):
-        for _, subwin in self.subwindows.items():
+    def viewer_update_stale(self):
+        """Catch up on cameras that changed while their subwindow was hidden"""
+        cam_idxs = [cam_idx for cam_idx in self.stale_cam_idxs if self.is_subwindow_visible(self.subwindows[cam_idx])]
+        if not cam_idxs:
+            return
+        self.stale_cam_idxs.difference_update(cam_idxs)
+        self.viewer_update_images(cam_idxs=cam_idxs)
+        self.viewer_plot_labels(cam_idxs=cam_idxs)
+        self.viewer_plot_ref_labels(cam_idxs=cam_idxs)
+        self.prefetch_frames()
+
+    def is_subwindow_visible(self, subwin: ViewerSubWindow) -> bool:
+        if self.mdi.viewMode() == QMdiArea.TabbedView:
+            # Only the current tab is shown, the current subwindow is kept while the main window is inactive
+            current_subwin = self.mdi.currentSubWindow()
+            return current_subwin is None or current_subwin is subwin
+        return True
+
+    def get_subwindows(self, cam_idxs=None):
+        """
+        Visible subwindows of the given cameras (defaults to all). Hidden ones are marked as stale and are only drawn
+        once they are shown.
+        """
+        if cam_idxs is None:
+            cam_idxs = self.subwindows.keys()
+        subwindows = {}
+        for cam_idx in cam_idxs:
+            subwin = self.subwindows.get(cam_idx)
+            if subwin is None:
+                continue
+            if self.is_subwindow_visible(subwin):
+                subwindows[cam_idx] = subwin
+            else:
+                self.stale_cam_idxs.add(cam_idx)
+        return subwindows
+
+    def viewer_update_images(self, cam_idxs=None):
+        subwindows = self.get_subwindows(cam_idxs)
+        # Decode all cameras concurrently, drawing happens in the GUI thread once every frame is available
+        if self.frame_decoder is not None:
+            self.frame_decoder.decode([(subwin.frame_cache, subwin.frame_idx) for subwin in subwindows.values()
+                                       if subwin.frame_idx is not None])
+        for _, subwin in subwindows.items():
             subwin.redraw_frame()
 
-    def viewer_plot_labels(self, label_names=None, current_label_name=None):
+    def viewer_plot_labels(self, label_names=None, current_label_name=None, cam_idxs=None):
         if label_names is None:
-            label_names = label_lib.get_labels(self.labels)
+            label_names = self.labels.get_label_names()
+        else:
+            label_names = [ln for ln in label_names if ln in self.labels.label_idxs]
         if current_label_name is None:
             current_label_name = self.get_current_label()
+        label_idxs = [self.labels.label_idxs[ln] for ln in label_names]
 
-        for cam_idx, subwin in self.subwindows.items():
+        for cam_idx, subwin in self.get_subwindows(cam_idxs).items():
             frame_idx = subwin.frame_idx
-            logger.log(logging.INFO, "<" * 10 + f" CAM: {cam_idx} > FRAME: {frame_idx} " + ">" * 10)
+            if trace_render.enabled:
+                trace_render.log(logging.DEBUG, "Plotting labels of cam %s, frame %s", cam_idx, frame_idx)
             if frame_idx is None:
-                subwin.clear_all_labels()
+                subwin.hide_all_labels()
                 subwin.label_labeler.setText("")
                 continue
 
             subwin.label_labeler.setText(
-                ", ".join(label_lib.get_frame_labelers(self.labels, subwin.frame_idx))
+                ", ".join(self.labels.get_frame_labelers(subwin.frame_idx))
             )
-            # Plot each label
-            for label_name in label_names:
-                label_dict = self.labels['labels'].get(label_name, {})
-
-                if frame_idx in label_dict and \
-                        not np.any(np.isnan(label_dict[frame_idx]['coords'][cam_idx])):
-                    # Plot actual/annotated labels
-                    point = label_dict[frame_idx]['coords'][cam_idx, :]
-                    labeler = self.labels['labeler_list'][label_dict[frame_idx]['labeler'][cam_idx]]
-                    logger.log(logging.INFO, f"label\t{label_name}\t{frame_idx}\t{labeler}\t{point}")
-                    subwin.draw_label(point[0], point[1], label_name,
-                                      current_label=current_label_name == label_name)
-                    subwin.clear_label(label_name, label_type='guess_label')
-
-                else:
-                    # Plot a guess position based on previous or/and next frames
-                    point = np.full((1, 2), np.nan)
-
-                    # Try to take mean of a symmetrical situation
-                    for offs in range(1, 4):
-                        if frame_idx - offs in label_dict and \
-                                not np.any(np.isnan(label_dict[frame_idx - offs]['coords'][cam_idx])) and \
-                                frame_idx + offs in label_dict and \
-                                not np.any(np.isnan(label_dict[frame_idx + offs]['coords'][cam_idx])):
-                            point = np.nanmean([point,
-                                                label_dict[frame_idx - offs]['coords'][(cam_idx,),],
-                                                label_dict[frame_idx + offs]['coords'][(cam_idx,),]
-                                                ], axis=0)
-                            break
-
-                    if np.any(np.isnan(point)):
-                        # Fill from one closest neighbor
-                        for offs in [-1, 1, -2, 2, -3, 3]:
-                            if frame_idx + offs in label_dict:
-                                point = label_dict[frame_idx + offs]['coords'][(cam_idx,),]
-                                break
-
-                    if ~np.any(np.isnan(point)):
-                        subwin.draw_label(point[0][0], point[0][1], label_name,
-                                          label_type='guess_label',
-                                          current_label=current_label_name == label_name)
-
-    def viewer_plot_ref_labels(self):
+            # All labels of the frame are a single slice of the label store
+            frame_points = self.labels.get_frame_coords(frame_idx, cam_idx)[label_idxs]
+            frame_labelers = self.labels.get_frame(frame_idx, 'labeler')[label_idxs, cam_idx]
+            is_labeled = ~np.any(np.isnan(frame_points), axis=1)
+            # Guess positions based on previous or/and next frames, only shown for labels without annotation
+            guess_points = self.label_guesser.get_guesses(frame_idx)[label_idxs, cam_idx]
+            is_guessed = ~is_labeled & ~np.any(np.isnan(guess_points), axis=1)
+
+            if trace_render.enabled:
+                for label_name, point, labeler_idx in zip(np.asarray(label_names)[is_labeled],
+                                                          frame_points[is_labeled], frame_labelers[is_labeled]):
+                    trace_render.log(logging.DEBUG, "label\t%s\t%s\t%s\t%s", label_name, frame_idx,
+                                     self.labels.labeler_list[labeler_idx], point)
+
+            # NaN points hide the respective label
+            subwin.draw_labels(label_names, np.where(is_labeled[:, None], frame_points, np.nan))
+            subwin.draw_labels(label_names, np.where(is_guessed[:, None], guess_points, np.nan),
+                               label_type='guess_label')
+            if current_label_name in label_names and current_label_name != subwin.current_label_name:
+                current_idx = label_names.index(current_label_name)
+                if is_labeled[current_idx] or is_guessed[current_idx]:
+                    subwin.set_current_label(current_label_name)
+            subwin.update_overlays()
+
+    def viewer_plot_ref_labels(self, label_names=None, cam_idxs=None):
         # Plot reference labels
+        if label_names is None:
+            label_names = self.ref_labels.label_names
 
-        for cam_idx, subwin in self.subwindows.items():
+        for cam_idx, subwin in self.get_subwindows(cam_idxs).items():
             frame_idx = subwin.frame_idx
             if frame_idx is None:
                 continue
 
             display_only_annotated = self.checkbox_disp_ref_annotated.isChecked()
-            ref_label_names = self.ref_labels['labels'].keys()
+            ref_label_names = [ln for ln in label_names if ln in self.ref_labels.label_idxs]
 
             if display_only_annotated:
-                label_names = label_lib.get_labels_from_frame(self.labels, frame_idx)
-                ref_label_names = list(set(ref_label_names) & set(label_names))
+                frame_label_names = self.labels.get_labels_from_frame(frame_idx)
+                ref_label_names = [ln for ln in ref_label_names if ln in frame_label_names]
 
-            for ln in ref_label_names:
-                if frame_idx in self.ref_labels['labels'][ln] and \
-                        not np.any(np.isnan(self.ref_labels['labels'][ln][frame_idx]['coords'][cam_idx])):
+            for ln in label_names:
+                if ln not in ref_label_names:
+                    subwin.hide_label(ln, label_type='ref_label')
+                    subwin.hide_label(ln, label_type='error_line')
+                    continue
 
-                    ref_label_dict = self.ref_labels['labels'][ln]
-                    point = ref_label_dict[frame_idx]['coords'][cam_idx]
-                    subwin.draw_label(point[0], point[1], ln, label_type="ref_label")
+                ref_point = self.ref_labels.get_point(ln, frame_idx, cam_idx)
+                if ref_point is not None:
+                    subwin.draw_label(ref_point[0], ref_point[1], ln, label_type="ref_label")
 
                     # Draw correspondence line between ref label and annotation
-                    label_dict = self.labels['labels'].get(ln, {})
-                    if frame_idx in label_dict and \
-                            not np.any(np.isnan(label_dict[frame_idx]['coords'][cam_idx])):
-                        line_coords = np.concatenate((label_dict[frame_idx]['coords'][(cam_idx,), :],
-                                                      ref_label_dict[frame_idx]['coords'][(cam_idx,), :]), axis=0)
-                        logger.log(logging.DEBUG, f"Drawing line, {line_coords.shape}, {line_coords}")
+                    point = self.labels.get_point(ln, frame_idx, cam_idx)
+                    if point is not None:
+                        line_coords = np.stack((point, ref_point), axis=0)
+                        if trace_render.enabled:
+                            trace_render.log(logging.DEBUG, "Drawing line %s", line_coords)
                         subwin.draw_line(*line_coords.T, line_name=ln, line_type='error_line')
+                    else:
+                        subwin.hide_label(ln, label_type='error_line')
+                else:
+                    subwin.hide_label(ln, label_type='ref_label')
+                    subwin.hide_label(ln, label_type='error_line')
+            subwin.update_overlays()
 
     def viewer_click(self, x: float, y: float, cam_frame_idx: int, cam_idx: int, action: str = 'create_label'):
         current_label_name = self.get_current_label()
@@ -442,7 +697,7 @@ class MainWindow(QMainWindow):
             case 'select_label':
                 coords = np.array([x, y], dtype=np.float64)
                 point_dists = []
-                frame_labels = label_lib.get_labels_from_frame(self.labels, frame_idx=cam_frame_idx)
+                frame_labels = self.labels.get_labels_from_frame(cam_frame_idx)
                 frame_guess_labels = self.subwindows[cam_idx].get_labels('guess_label')
                 if not len(frame_labels) and not len(frame_guess_labels):
                     return
@@ -479,6 +734,7 @@ class MainWindow(QMainWindow):
             case 'create_label':
                 self.add_label([x, y], current_label_name, cam_frame_idx, cam_idx)
                 self.viewer_plot_labels(label_names=[current_label_name])
+                self.viewer_plot_ref_labels(label_names=[current_label_name])
                 if self.dock_controls.widgets['buttons']['single_label_mode'].isChecked():
                     self.goto_next_time()
 
@@ -487,20 +743,14 @@ class MainWindow(QMainWindow):
                 pass
 
             case 'delete_label':
-                if self.user not in self.labels['labeler_list']:
-                    self.labels['labeler_list'].append(self.user)
+                labeler_idx = self.labels.get_labeler_idx(self.user)
 
-                label_dict = self.labels['labels'].get(current_label_name, {})
-                # Only delete the label if it already exists
-                if (cam_frame_idx in label_dict and
-                        not np.any(np.isnan(label_dict[cam_frame_idx]['coords'][cam_idx, :]))):
-                    label_dict[cam_frame_idx]['coords'][cam_idx, :] = np.nan
-                    # For synchronization, deletion time and user must be recorded
-                    label_dict[cam_frame_idx]['point_times'][cam_idx] = time.time()
-                    label_dict[cam_frame_idx]['labeler'][cam_idx] = self.labels['labeler_list'].index(self.user)
-
-                    self.subwindows[cam_idx].clear_label(label_name=current_label_name,
-                                                         label_type='label')
+                # Only delete the label if it already exists. For synchronization, deletion time and user are recorded
+                if self.labels.delete_point(current_label_name, cam_frame_idx, cam_idx,
+                                            point_time=time.time(), labeler_idx=labeler_idx):
+                    self.record_label_edit(current_label_name, cam_frame_idx, cam_idx)
+                    self.viewer_plot_labels(label_names=[current_label_name], cam_idxs=[cam_idx])
+                    self.viewer_plot_ref_labels(label_names=[current_label_name], cam_idxs=[cam_idx])
 
                 if self.dock_controls.widgets['buttons']['single_label_mode'].isChecked():
                     self.goto_next_time()
@@ -514,10 +764,6 @@ class MainWindow(QMainWindow):
         for _, subwin in self.subwindows.items():
             subwin.rotate_view(rot_angle=(subwin.rot_angle + 90) % 360)
 
-    def viewer_clear_labels(self):
-        for cam_idx, subwin in self.subwindows.items():
-            subwin.clear_all_labels()
-
     def viewer_zoom_reset(self):
         # Reset view in all the subwindows
         for _, subwin in self.subwindows.items():
@@ -527,41 +773,68 @@ class MainWindow(QMainWindow):
             subwin.rotate_view(rot_angle=0)
             subwin.rotate_view(rot_angle=current_angle)
 
-            subwin.plot_wget.autoRange()
+            subwin.zoom_reset()
 
     # Mqtt functions
     def mqtt_connect(self):
         if isinstance(self.sync, bool):
             return
         try:
-            self.mqtt_client = mqtt.Client(protocol=mqtt.MQTTv5)
-            self.mqtt_client.on_message = self.mqtt_on_message
-            self.mqtt_client.connect("127.0.0.1", 1883, 60)
-            mqtt_options = SubscribeOptions(noLocal=True)
-            self.mqtt_client.subscribe(self.sync, options=mqtt_options)
-            self.mqtt_client.loop_start()
-            logger.log(logging.INFO, f'MQTT connected to {self.sync}')
-        except ConnectionRefusedError:
+            self.mqtt_connection = MqttConnection(host=self.cfg.get('sync_host', "127.0.0.1"),
+                                                  port=self.cfg.get('sync_port', 1883))
+            self.mqtt_connection.connect()
+        except OSError:
             logger.log(logging.ERROR, "No connection to MQTT server.")
-            self.mqtt_client = None
+            self.mqtt_connection = None
+            return
+        # Intermediate signal is implemented to avoid issues with Qt components, since Qt components are not thread safe.
+        self.time_sync = TimeSync(self.mqtt_connection, self.sync, on_time=self.sync_time_signal.emit,
+                                  max_rate=self.cfg.get('sync_max_rate', 30))
+        logger.log(logging.INFO, f'MQTT connected to {self.sync}')
+
+        if self.cfg.get('sync_labels', False):
+            label_topic = self.cfg.get('sync_labels_topic', f"bbo/sync/labels/{self.dataset_name}")
+            self.label_sync = LabelSync(self.mqtt_connection, label_topic, on_records=self.sync_labels_signal.emit)
+            logger.log(logging.INFO, f'Sharing label edits on {label_topic}')
 
     def mqtt_publish(self):
-        if self.mqtt_client is not None:
+        if self.time_sync is not None:
             try:
-                logger.log(logging.DEBUG, "Publishing to MQTT server.")
-                self.mqtt_client.publish("bbo/sync/t", payload=str(self.current_time))
-            except ConnectionRefusedError:
+                self.time_sync.publish(self.current_time)
+            except OSError:
                 logger.log(logging.ERROR, "No connection to MQTT server.")
-                self.mqtt_client = None
+                self.time_sync = None
+
+    def sync_time_received(self):
+        # Times received while the previous one was rendered have been collapsed into the newest
+        msg_time = self.time_sync.take_pending() if self.time_sync is not None else None
+        if msg_time is not None:
+            self.set_time(msg_time, mqtt_publish=False)
+
+    def sync_labels_received(self):
+        if self.label_sync is None:
+            return
+        changed_frames = {}
+        for record in self.label_sync.take_pending():
+            if record['cam'] >= self.labels.n_cams:
+                continue
+            # Last writer wins, by point time
+            if LabelJournal.apply_record(self.labels, record, newer_only=True):
+                if self.label_journal is not None:
+                    self.label_journal.append(record)
+                changed_frames.setdefault(record['label'], set()).add((record['frame'], record['cam']))
+        if not changed_frames:
+            return
 
-    def mqtt_on_message(self, client, userdata, message):
-        # TODO: Test this function
-        logger.log(logging.INFO, f"Received message '{message.payload.decode()}' on topic '{message.topic}'")
-        match message.topic:
-            case "bbo/sync/t":
-                msg_time = float(message.payload.decode())
-                # Intermediate signal is implemented to avoid issues with Qt components, since Qt components are not thread safe.
-                self.mqtt_message_signal.emit(msg_time)
+        # Redraw only the labels whose points, or guesses, changed on the displayed frames
+        window = self.label_guesser.window
+        for label_name, points in changed_frames.items():
+            cam_idxs = [cam_idx for cam_idx, subwin in self.subwindows.items()
+                        if subwin.frame_idx is not None and
+                        any(cam == cam_idx and abs(fr_idx - subwin.frame_idx) <= window for fr_idx, cam in points)]
+            if cam_idxs:
+                self.viewer_plot_labels(label_names=[label_name], cam_idxs=cam_idxs)
+                self.viewer_plot_ref_labels(label_names=[label_name], cam_idxs=cam_idxs)
 
     # Getter functions
     def get_current_time(self):
@@ -582,25 +855,46 @@ class MainWindow(QMainWindow):
     def get_y_res(self):
         return [ss[1] for ss in self.get_sensor_sizes()]
 
-    def get_valid_time(self, input_time: float):
+    def get_valid_time(self, input_time: float, reference_time: float | None = None):
         """
-            Returns a valid time that is closest to the given 'input_time'
+            Returns a valid time that is closest to the given 'input_time', searching from 'reference_time'
+            (defaults to the current time) towards 'input_time'
             # TODO: add more documentation or make it better
         """
-        times_arr = np.asarray(self.times)
-        current_time_idx = self.times.index(self.current_time)
-        diff_sign = int(np.sign(input_time - self.current_time))
+        if len(self.time_index) == 0:
+            return reference_time
+        time_idx = self.time_index.nearest_index(input_time, reference_idx=self.get_time_idx(reference_time))
+        return self.time_index[time_idx]
 
-        if diff_sign > 0:
-            search_slice = times_arr[current_time_idx:]
-        else:
-            search_slice = times_arr[:current_time_idx + 1][::-1]
+    def get_moved_time(self, num: int, reference_time: float | None = None):
+        """
+            Returns the valid time 'num' timepoints away from 'reference_time' (defaults to the current time),
+            according to the d_time setting
+        """
+        if reference_time is None:
+            reference_time = self.current_time
 
-        if len(search_slice) > 0:
-            diff_idx = np.argmin(np.abs(search_slice - input_time))
-            return self.times[current_time_idx + (diff_sign * diff_idx)]
+        if self.d_time == 0:
+            next_time_idx = min(len(self.time_index) - 1, max(0, self.get_time_idx(reference_time) + num))
+            d_time = self.time_index[next_time_idx] - reference_time
+        elif self.d_time < 0:
+            cam_times = self.time_index.cam_times
+            cam_idx = min(len(cam_times) - 1, int(round(-self.d_time - 1)))
+            current_cam_time_idx = self.get_frame_idx(cam_idx, reference_time)
+            n_cam_times = len(cam_times[cam_idx])
+            next_cam_time_idx = min(n_cam_times - 1, max(0, current_cam_time_idx + num))
+            d_time = cam_times[cam_idx][next_cam_time_idx] - cam_times[cam_idx][current_cam_time_idx]
         else:
-            return self.current_time
+            d_time = self.d_time * num
+        return self.get_valid_time(reference_time + d_time, reference_time=reference_time)
+
+    def get_frame_idx(self, cam_idx: int, input_time: float):
+        return self.time_index.nearest_frame(cam_idx, input_time)
+
+    def get_time_idx(self, input_time: float):
+        if input_time == self.current_time and self.current_time_idx is not None:
+            return self.current_time_idx
+        return self.time_index.index(input_time)
 
     def get_current_label(self):
         selected_label = self.dock_sketch.list_labels.currentItem()
@@ -611,22 +905,56 @@ class MainWindow(QMainWindow):
 
     # Setter functions
     def set_time(self, valid_input_time: float, mqtt_publish=True, time_field_update=True):
-        if valid_input_time not in self.times:
+        # An explicitly set time supersedes pending navigation
+        self.navigation_scheduler.cancel()
+        time_idx = self.time_index.index(valid_input_time)
+        if time_idx is None:
             return
 
-        self.current_time = valid_input_time
+        if self.current_time is not None and valid_input_time != self.current_time:
+            self.time_direction = int(np.sign(valid_input_time - self.current_time))
+        self.current_time = self.time_index[time_idx]
+        self.current_time_idx = time_idx
 
+        changed_cam_idxs = []
         for cam_idx, subwin in self.subwindows.items():
-            frame_idx = np.argmin(np.abs(np.array(self.cam_times[cam_idx])-valid_input_time))
-            subwin.frame_idx =frame_idx
+            frame_idx = self.get_frame_idx(cam_idx, valid_input_time)
+            if frame_idx != subwin.frame_idx:
+                subwin.frame_idx = frame_idx
+                changed_cam_idxs.append(cam_idx)
 
         if mqtt_publish:
             self.mqtt_publish()
 
-        # Viewer
-        self.viewer_change_frame()
+        # Viewer, only cameras that switched to another frame need to be redrawn
+        self.viewer_change_frame(cam_idxs=changed_cam_idxs)
         if time_field_update:
             self.dock_controls.widgets['fields']['current_time'].setText(str(round(self.current_time, 6)))
+        self.prefetch_frames()
+
+    def prefetch_frames(self):
+        """Decode the frames of the upcoming timepoints (and a few in the opposite direction) in the background"""
+        if self.frame_prefetcher is None:
+            return
+
+        prefetch_times = []
+        for direction, n_timepoints in [(self.time_direction, self.cfg.get('prefetch_ahead', 8)),
+                                        (-self.time_direction, self.cfg.get('prefetch_behind', 2))]:
+            t = self.current_time
+            for _ in range(n_timepoints):
+                next_t = self.get_moved_time(direction, reference_time=t)
+                if next_t == t:
+                    break
+                prefetch_times.append(next_t)
+                t = next_t
+
+        requests = {}
+        for cam_idx, subwin in self.subwindows.items():
+            if not self.is_subwindow_visible(subwin):
+                continue
+            frame_idxs = list(dict.fromkeys(self.get_frame_idx(cam_idx, t) for t in prefetch_times))
+            requests[cam_idx] = (subwin.frame_cache, frame_idxs)
+        self.frame_prefetcher.prefetch(requests)
 
     def set_d_time(self):
         self.d_time = float(self.dock_controls.widgets['fields']['d_time'].text())
@@ -640,17 +968,24 @@ class MainWindow(QMainWindow):
         self.resizeDocks([self.dock_sketch, self.dock_controls],
                          [600, 600], Qt.Horizontal)
 
+        if self.dock_perf is not None:
+            self.addDockWidget(Qt.BottomDockWidgetArea, self.dock_perf)
+            self.dock_perf.hide()
+
     def trigger_autosave_event(self):
+        if not self.gui_loaded:
+            return
         if self.cfg['auto_save']:
             self.auto_save_counter = self.auto_save_counter + 1
-            if np.mod(self.auto_save_counter, self.cfg['auto_save_N0']) == 0:
-                file = self.labels_folder / 'labels.yml'  # this is equal to self.labels_file
-                self.save_labels(file)
-                logger.log(logging.INFO, 'Automatically saved labels ({:s})'.format(file.as_posix()))
+            # With a label journal, every edit is already on disk and the labels file is only rewritten on save/exit
+            if self.label_journal is None and np.mod(self.auto_save_counter, self.cfg['auto_save_N0']) == 0:
+                file = self.labels_file
+                if self.save_labels(file, only_if_changed=True):
+                    logger.log(logging.INFO, 'Automatically saved labels ({:s})'.format(file.as_posix()))
             if np.mod(self.auto_save_counter, self.cfg['auto_save_N1']) == 0:
-                file = self.labels_folder / 'autosave' / 'labels.yml'
-                self.save_labels(file)
-                logger.log(logging.INFO, 'Automatically saved labels ({:s})'.format(file.as_posix()))
+                file = self.labels_folder / 'autosave' / self.labels_file.name
+                if self.save_labels(file, only_if_changed=True):
+                    logger.log(logging.INFO, 'Automatically saved labels ({:s})'.format(file.as_posix()))
 
                 self.auto_save_counter = 0
 
@@ -672,57 +1007,86 @@ class MainWindow(QMainWindow):
 
     # Others
     def add_label(self, coords, label_name, fr_idx, cam_idx):
-        data_shape = (len(self.cameras), 2)
-
-        label_dict = self.labels['labels'].setdefault(label_name, {})
-        frame_dict = label_dict.setdefault(fr_idx, {
-            'coords': np.full(data_shape, np.nan, dtype=np.float64),
-            'point_times': np.full(data_shape[0], 0, dtype=np.float64),
-            'labeler': np.full(data_shape[0], 0, dtype=np.uint16)
-        })
-
-        if self.user not in self.labels["labeler_list"]:
-            self.labels["labeler_list"].append(self.user)
-        frame_dict['labeler'][cam_idx] = self.labels["labeler_list"].index(self.user)
-        frame_dict['point_times'][cam_idx] = time.time()
         coords = np.array(coords, dtype=np.float64)
-        frame_dict['coords'][cam_idx] = coords
+        self.labels.set_point(label_name, fr_idx, cam_idx, coords,
+                              point_time=time.time(), labeler_idx=self.labels.get_labeler_idx(self.user))
+        self.record_label_edit(label_name, fr_idx, cam_idx)
 
-    def save_labels(self, file: Path = None):
+    def record_label_edit(self, label_name, fr_idx, cam_idx):
+        if self.label_journal is None and self.label_sync is None:
+            return
+        record = LabelJournal.make_record(self.labels, label_name, fr_idx, cam_idx)
+        if self.label_journal is not None:
+            self.label_journal.append(record)
+        if self.label_sync is not None:
+            self.label_sync.publish(record)
+
+    def save_labels(self, file: Path = None, only_if_changed=False) -> bool:
         """
         Save the current labels to a specified file.
 
         Args:
             file (Path, optional): The file path where the labels should be saved.
-                                   If not provided, the default path 'labels.yml'
-                                   in the labels folder will be used.
+                                   If not provided, the labels file in the labels folder
+                                   will be used. The format follows the file extension.
+            only_if_changed (bool): Skip the save if the labels did not change since the
+                                    last successful save to this file.
 
+        Returns:
+            bool: Whether a save was queued.
         """
+        if not self.gui_loaded:
+            logger.log(logging.WARNING, "Labels are not loaded yet, not saving")
+            return False
         if file is None:
-            file = self.labels_folder / 'labels.yml'
-
-        lock = threading.Lock()
-        if lock.acquire(timeout=30):
-            # Locking here ensures that the data for the save is only prepared after the lock is successfully acquired
-            try:
-                self.save_thread.submit(self.save_labels_thread, file, self.labels, lock)
-            except Exception as e:
-                lock.release()
-                raise e
+            file = self.labels_file
+
+        file = Path(file).expanduser().resolve()
+        if only_if_changed and self.saved_generations.get(file) == self.labels.generation:
+            logger.log(logging.DEBUG, f'Labels unchanged, skipping save ({file.as_posix()})')
+            return False
+
+        # Saving to the labels file compacts the journal: edits up to now are moved to a segment that is deleted
+        # once the file is written
+        journal_segment = None
+        if self.label_journal is not None and file == self.labels_file.expanduser().resolve():
+            journal_segment = self.label_journal.rotate()
+
+        # The snapshot is serialized in save_thread, while editing continues on self.labels
+        with self.pending_saves_lock:
+            is_queued = file in self.pending_saves
+            self.pending_saves[file] = (self.labels.snapshot(), journal_segment)
+        # Changes are only tracked for the label guesser, the store would otherwise keep all of them
+        self.labels.forget_changes(self.label_guesser.generation)
+        if is_queued:
+            # The queued save picks up the newer snapshot, its journal segment includes all older segments
+            logger.log(logging.DEBUG, f'Coalesced save of labels ({file.as_posix()})')
         else:
-            raise RuntimeError('Labels file lock not acquired for 30 seconds!')
+            self.save_thread.submit(self.save_labels_thread, file)
+        return True
+
+    def save_labels_thread(self, file: Path):
+        with self.pending_saves_lock:
+            labels, journal_segment = self.pending_saves.pop(file)
 
-    @staticmethod
-    def save_labels_thread(file: Path, labels, lock):
         try:
-            label_lib.save(file, labels)
-        finally:
-            lock.release()
+            label_io.save(file, labels)
+        except Exception as e:
+            logger.log(logging.ERROR, f'Saving labels ({file.as_posix()}) failed: {e}')
+            return
         logger.log(logging.INFO, f'Saved labels ({file.as_posix()})')
+        with self.pending_saves_lock:
+            self.saved_generations[file] = max(labels.generation, self.saved_generations.get(file, 0))
+
+        if self.label_journal is not None and journal_segment is not None:
+            self.label_journal.compact(journal_segment)
 
     def save_labels_as(self):
         """ MenuBar > Save As..."""
-        file = QFileDialog.getSaveFileName(self, "Save Labels As...", "", "Session File (*.yml)")[0]
+        if not self.gui_loaded:
+            return
+        file = QFileDialog.getSaveFileName(self, "Save Labels As...", "",
+                                           f"Session File (*.yml);;Binary Label File (*{label_io.BINARY_SUFFIX})")[0]
         if file:
             logger.log(logging.INFO, f"Saving Labels As {file}")
             self.save_labels(Path(file))
@@ -739,12 +1103,11 @@ class MainWindow(QMainWindow):
                 self.mdi.cascadeSubWindows()
             case _:
                 logger.log(logging.WARNING, f"Unknown MDI view mode selected")
+        self.viewer_update_stale()
 
     def sketch_select(self):
         self.trigger_autosave_event()
-        self.dock_sketch.clear_sketch()
-        self.dock_sketch.current_sketch_idx = self.dock_sketch.combobox_sketches.currentIndex()
-        self.dock_sketch.init_sketch()
+        self.dock_sketch.select_sketch(self.dock_sketch.combobox_sketches.currentIndex())
         self.dock_sketch.combobox_sketches.clearFocus()
 
         list_labels = self.dock_sketch.list_labels
@@ -762,20 +1125,12 @@ class MainWindow(QMainWindow):
             subwin.set_current_label(label_name=self.get_current_label())
 
     def move_num_timepoints(self, num: int):
-        if self.d_time == 0:
-            next_time_idx = min(len(self.times) - 1, self.times.index(self.current_time) + num)
-            d_time = self.times[next_time_idx] - self.current_time
-            # print(d_time)
-        elif self.d_time < 0:
-            cam_idx = min(len(self.cam_times)-1,int(round(-self.d_time-1)))
-            current_cam_time_idx = np.argmin(np.abs(np.array(self.cam_times[cam_idx])-self.current_time))
-            n_cam_times = len(self.cam_times[cam_idx])
-            # print(n_cam_times, current_cam_time_idx)
-            d_time = (self.cam_times[cam_idx][min(n_cam_times-1, current_cam_time_idx+num)]
-                      - self.cam_times[cam_idx][current_cam_time_idx])
-        else:
-            d_time = self.d_time * num
-        self.set_time(self.get_valid_time(self.current_time + d_time))
+        self.set_time(self.get_moved_time(num))
+
+    def schedule_move_num_timepoints(self, num: int):
+        """Like move_num_timepoints, but steps from and replaces the pending navigation target, if there is one"""
+        self.navigation_scheduler.request(
+            self.get_moved_time(num, reference_time=self.navigation_scheduler.pending_time))
 
     def goto_next_time(self):
         self.move_num_timepoints(1)
@@ -789,16 +1144,19 @@ class MainWindow(QMainWindow):
         # self.dock_controls.widgets['fields']['current_time'].clearFocus()
 
     def viewer_wheel_event(self, delta: int):
-        self.move_num_timepoints(num=int(round(delta / 120)))
+        self.schedule_move_num_timepoints(num=int(round(delta / 120)))
 
     # Shortcuts
     def keyPressEvent(self, event):
+        # Shortcuts need the loaded session
+        if not self.gui_loaded:
+            return
         controls_cfg = self.cfg['controls']
 
         if controls_cfg['buttons']['next_time'] and event.key() == Qt.Key_D:
-            self.goto_next_time()
+            self.schedule_move_num_timepoints(1)
         elif controls_cfg['buttons']['previous_time'] and event.key() == Qt.Key_A:
-            self.goto_previous_time()
+            self.schedule_move_num_timepoints(-1)
         elif not event.isAutoRepeat():
             if controls_cfg['buttons']['save_labels'] and event.key() == Qt.Key_S:
                 self.save_labels()
@@ -813,8 +1171,25 @@ class MainWindow(QMainWindow):
                 self.dock_controls.widgets['buttons']['rotate'].click()
 
     def closeEvent(self, event):
+        if self.time_sync is not None:
+            self.time_sync.close()
+        if self.mqtt_connection is not None:
+            self.mqtt_connection.close()
+        if self.frame_prefetcher is not None:
+            self.frame_prefetcher.shutdown()
+        if self.frame_decoder is not None:
+            self.frame_decoder.shutdown()
+
+        if not self.gui_loaded:
+            # Closed while loading: nothing was edited, and the labels may be incomplete
+            if self.load_executor is not None:
+                self.load_executor.shutdown(wait=False, cancel_futures=True)
+            return
+
         if self.cfg['exit_save_labels']:
-            self.save_labels()
+            self.save_labels(only_if_changed=True)
+        if self.label_journal is not None:
+            self.label_journal.close()
 
         file_exit_status = self.labels_folder / 'exit_status.npy'
         if file_exit_status.is_file():
@@ -824,6 +1199,10 @@ class MainWindow(QMainWindow):
         exit_status['i_time'] = self.current_time
         np.save(file_exit_status, exit_status)
 
+        if perf.stats is not None and perf.dump_file is not None:
+            perf.stats.dump(perf.dump_file)
+            logger.log(logging.INFO, f"Wrote performance statistics to {perf.dump_file}")
+
 
 class UnsupportedFormatException(Exception):
     pass
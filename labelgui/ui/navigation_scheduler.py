@@ -0,0 +1,48 @@
+from typing import Callable
+
+from PyQt5.QtCore import QObject, QTimer, QElapsedTimer
+from PyQt5.QtGui import QGuiApplication
+
+
+class NavigationScheduler(QObject):
+    """
+    Collapses time changes requested by input events into the newest target.
+
+    Requests only store the target time; it is applied from a timer at most once per display refresh. Input events
+    that queue up while a frame is being rendered therefore only move the target, and once input stops, exactly the
+    final target is rendered.
+    """
+
+    def __init__(self, apply_time: Callable[[float], None], interval_ms: int | None = None, parent=None):
+        super().__init__(parent)
+        self.apply_time = apply_time
+        if interval_ms is None:
+            screen = QGuiApplication.primaryScreen()
+            refresh_rate = screen.refreshRate() if screen is not None else 0
+            interval_ms = int(1000 / refresh_rate) if refresh_rate > 0 else 16
+        self.interval_ms = interval_ms
+        self.pending_time: float | None = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        self._last_apply = QElapsedTimer()
+
+    def request(self, target_time: float):
+        self.pending_time = target_time
+        if not self._timer.isActive():
+            elapsed = self._last_apply.elapsed() if self._last_apply.isValid() else self.interval_ms
+            self._timer.start(max(0, self.interval_ms - elapsed))
+
+    def cancel(self):
+        self.pending_time = None
+        self._timer.stop()
+
+    def flush(self):
+        self._timer.stop()
+        if self.pending_time is None:
+            return
+        target_time = self.pending_time
+        self.pending_time = None
+        self._last_apply.start()
+        self.apply_time(target_time)
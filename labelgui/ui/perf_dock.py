@@ -0,0 +1,44 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QDockWidget, QTableWidget, QTableWidgetItem, QHeaderView
+
+from labelgui.perf import PerfStats
+
+
+class PerfDock(QDockWidget):
+    """Table of the latencies measured by labelgui.perf, refreshed while visible"""
+
+    COLUMNS = ['n', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+
+    def __init__(self, stats: PerfStats, interval_ms: int = 1000):
+        super().__init__("Performance")
+        self.setFeatures(QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetFloatable |
+                         QDockWidget.DockWidgetClosable)
+        self.stats = stats
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([column.replace('_ms', ' [ms]') for column in self.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.setWidget(self.table)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.on_visibility_changed)
+
+    def on_visibility_changed(self, visible: bool):
+        if visible:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        summary = self.stats.summary()
+        self.table.setRowCount(len(summary))
+        self.table.setVerticalHeaderLabels(list(summary.keys()))
+        for row, values in enumerate(summary.values()):
+            for col, column in enumerate(self.COLUMNS):
+                value = values[column]
+                text = str(value) if isinstance(value, int) else f"{value:.2f}"
+                self.table.setItem(row, col, QTableWidgetItem(text))
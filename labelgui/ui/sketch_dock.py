@@ -1,12 +1,16 @@
 import logging
+from collections import OrderedDict
+
 import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QWidget, QDockWidget, QVBoxLayout, QComboBox,
                              QListWidget, QHBoxLayout, QAbstractItemView, QPushButton)
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
 from pathlib import Path
 from typing import List
 
+from labelgui import sketch_io
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,26 +20,33 @@ class SketchDock(QDockWidget):
 
     This widget allows users to view sketches, zoom in on specific areas,
     and interact with labeled points on the sketch.
+
+    The sketch image and label markers are set once per sketch. Selecting a label only moves the highlight markers
+    and the zoom view range, which pyqtgraph repaints from the cached image.
     """
 
-    FULL_SKETCH_DIMS = [0 / 3, 1 / 18, 1 / 3, 16 / 18]
-    ZOOM_SKETCH_DIMS = [1 / 3, 5 / 18, 2 / 3, 12 / 18]
+    MAX_CACHED_SKETCHES = 4
+    VIEW_KEYS = ('sketch', 'sketch_zoom')
+    VIEW_TITLES = {'sketch': 'Full:', 'sketch_zoom': 'Zoom:'}
+    # Relative widths of the full and zoom views
+    VIEW_STRETCH = {'sketch': 1, 'sketch_zoom': 2}
+    # Keyword arguments of the ScatterPlotItem of the label markers, per view
+    LABEL_MARKER_PARAMS = {
+        'sketch': {'symbol': 'o', 'size': 5, 'brush': 'orange', 'pen': None},
+        'sketch_zoom': {'symbol': 'o', 'size': 8, 'brush': 'orange', 'pen': None},
+    }
     # highlight markers
     HIGHLIGHT_DOT_PARAMS = {
-        'color': 'darkgreen',
-        'marker': '.',
-        'markersize': 2,
-        'alpha': 1.0,
-        'zorder': 2,
+        'symbol': 'o',
+        'size': 3,
+        'brush': 'darkgreen',
+        'pen': None,
     }
     HIGHLIGHT_CIRCLE_PARAMS = {
-        'color': 'darkgreen',
-        'marker': 'o',
-        'markersize': 40,
-        'markeredgewidth': 4,
-        'fillstyle': 'none',
-        'alpha': 2 / 3,
-        'zorder': 2,
+        'symbol': 'o',
+        'size': 40,
+        'brush': None,
+        'pen': {'color': (0, 100, 0, 170), 'width': 4},
     }
 
     def __init__(self):
@@ -46,8 +57,9 @@ class SketchDock(QDockWidget):
         self.graph_widgets = {
             # Graphical widgets
             'canvas': {},
-            'figs': {},
-            'axes': {},
+            'views': {},
+            'images': {},
+            'label_markers': {},
             'highlight_dot': {},
             'highlight_circle': {}
         }
@@ -55,7 +67,9 @@ class SketchDock(QDockWidget):
             'buttons': {},
             'lists': {}
         }
-        self.sketches = []
+        self.sketch_files = []
+        # Recently shown sketches, loaded on demand, see sketch_io.load_sketch
+        self.sketches = OrderedDict()
         self.current_sketch_idx = None
         self.sketches_loaded = False
 
@@ -66,16 +80,30 @@ class SketchDock(QDockWidget):
         main_widget = QWidget()
         main_layout = QVBoxLayout(main_widget)
 
-        self.graph_widgets['figs']['sketch'] = Figure()
-        self.graph_widgets['canvas']['sketch'] = FigureCanvasQTAgg(self.graph_widgets['figs']['sketch'])
-
-        # full
-        self.graph_widgets['axes']['sketch'] = self.graph_widgets['figs']['sketch'].add_axes(self.FULL_SKETCH_DIMS)
-
-        # zoom
-        self.graph_widgets['axes']['sketch_zoom'] = self.graph_widgets['figs']['sketch'].add_axes(self.ZOOM_SKETCH_DIMS)
-
-        main_layout.addWidget(self.graph_widgets['canvas']['sketch'])
+        canvas = pg.GraphicsLayoutWidget()
+        canvas.setBackground('w')
+        self.graph_widgets['canvas']['sketch'] = canvas
+        for col, view_key in enumerate(self.VIEW_KEYS):
+            canvas.addLabel(self.VIEW_TITLES[view_key], row=0, col=col, color='k')
+            view = canvas.addViewBox(row=1, col=col, enableMenu=False, invertY=True, lockAspect=True)
+            view.setMouseEnabled(False, False)
+            canvas.ci.layout.setColumnStretchFactor(col, self.VIEW_STRETCH[view_key])
+            self.graph_widgets['views'][view_key] = view
+
+            image = pg.ImageItem(axisOrder='row-major')
+            view.addItem(image)
+            self.graph_widgets['images'][view_key] = image
+            for item_key, params in (('label_markers', self.LABEL_MARKER_PARAMS[view_key]),
+                                     ('highlight_dot', self.HIGHLIGHT_DOT_PARAMS),
+                                     ('highlight_circle', self.HIGHLIGHT_CIRCLE_PARAMS)):
+                item = pg.ScatterPlotItem(symbol=params['symbol'], size=params['size'],
+                                          brush=pg.mkBrush(params['brush']) if params['brush'] else None,
+                                          pen=pg.mkPen(**params['pen']) if params['pen'] else None)
+                item.setZValue(10)
+                view.addItem(item)
+                self.graph_widgets[item_key][view_key] = item
+
+        main_layout.addWidget(canvas)
 
         # Sketch selection combo
         self.combobox_sketches = QComboBox()
@@ -100,79 +128,65 @@ class SketchDock(QDockWidget):
         self.setWidget(main_widget)
 
     def load_sketches(self, sketch_files: List[Path]):
-        # load sketches
-        sketches = []
+        # Sketches are only read when they are shown
+        existing_files = []
         for sf in sketch_files:
             if sf.exists():
-                sketches.append(np.load(sf.as_posix(), allow_pickle=True)[()])
+                existing_files.append(sf)
             else:
                 logger.log(logging.WARNING, f'Autoloading failed. Sketch file {sf} does not exist.')
 
-        if len(sketches):
-            self.sketches = sketches
+        if len(existing_files):
+            self.sketch_files = existing_files
+            self.sketches.clear()
             self.current_sketch_idx = 0
             self.sketches_loaded = True
 
+    def get_sketch(self) -> dict:
+        sketch = self.sketches.get(self.current_sketch_idx)
+        if sketch is None:
+            sketch = sketch_io.load_sketch(self.sketch_files[self.current_sketch_idx])
+            self.sketches[self.current_sketch_idx] = sketch
+            if len(self.sketches) > self.MAX_CACHED_SKETCHES:
+                self.sketches.popitem(last=False)
+        else:
+            self.sketches.move_to_end(self.current_sketch_idx)
+        return sketch
+
+    def select_sketch(self, sketch_idx: int):
+        self.current_sketch_idx = sketch_idx
+        self.init_sketch()
+
     def init_sketch(self):
         sketch = self.get_sketch_image()
         self.set_sketch_zoom()
 
+        for view_key in self.VIEW_KEYS:
+            self.graph_widgets['images'][view_key].setImage(sketch, autoLevels=False, levels=(0, 255))
         # full
-        self.graph_widgets['axes']['sketch'].imshow(sketch)
-        self.graph_widgets['axes']['sketch'].axis('off')
-        self.graph_widgets['axes']['sketch'].set_title('Full:',
-                                                       ha='center', va='center',
-                                                       zorder=0)
-
+        self.graph_widgets['views']['sketch'].autoRange(padding=0)
         # zoom
-        self.graph_widgets['axes']['sketch_zoom'].imshow(sketch)
-        self.graph_widgets['axes']['sketch_zoom'].set_xlim(
-            [np.shape(sketch)[1] / 2 - self.sketch_zoom_dx, np.shape(sketch)[1] / 2 + self.sketch_zoom_dx])
-        self.graph_widgets['axes']['sketch_zoom'].set_ylim(
-            [np.shape(sketch)[0] / 2 - self.sketch_zoom_dy, np.shape(sketch)[0] / 2 + self.sketch_zoom_dy])
-        self.graph_widgets['axes']['sketch_zoom'].axis('off')
-        self.graph_widgets['axes']['sketch_zoom'].set_title('Zoom:',
-                                                            ha='center', va='center',
-                                                            zorder=0)
+        self.set_zoom_range(np.shape(sketch)[1] / 2, np.shape(sketch)[0] / 2)
 
         self.init_sketch_labels()
         self.update_sketch()
 
     def init_sketch_labels(self):
         # Plot all the labels
-        for label_name, label_location in self.get_sketch_labels().items():
-            self.graph_widgets['axes']['sketch'].plot([label_location[0]], [label_location[1]],
-                                                      marker='o',
-                                                      color='orange',
-                                                      markersize=3,
-                                                      zorder=1)
-
-            self.graph_widgets['axes']['sketch_zoom'].plot([label_location[0]],
-                                                           [label_location[1]],
-                                                           marker='o',
-                                                           color='orange',
-                                                           markersize=5,
-                                                           zorder=1)
-
-        self.graph_widgets['highlight_dot']['sketch'] = self.graph_widgets['axes']['sketch'].plot(
-            [np.nan], [np.nan], **self.HIGHLIGHT_DOT_PARAMS)[0]
-        self.graph_widgets['highlight_dot']['sketch_zoom'] = self.graph_widgets['axes']['sketch_zoom'].plot(
-            [np.nan], [np.nan], **self.HIGHLIGHT_DOT_PARAMS)[0]
-        self.graph_widgets['highlight_circle']['sketch'] = self.graph_widgets['axes']['sketch'].plot(
-            [np.nan], [np.nan], **self.HIGHLIGHT_CIRCLE_PARAMS)[0]
-        self.graph_widgets['highlight_circle']['sketch_zoom'] = self.graph_widgets['axes']['sketch_zoom'].plot(
-            [np.nan], [np.nan], **self.HIGHLIGHT_CIRCLE_PARAMS)[0]
+        label_coordinates = self.get_sketch_label_coordinates()
+        for view_key in self.VIEW_KEYS:
+            self.graph_widgets['label_markers'][view_key].setData(pos=label_coordinates)
 
     def fill_controls(self):
         # Fill non-graphic controls
         self.combobox_sketches.setDisabled(False)
         self.combobox_sketches.addItems([f'Sketch {i:03d}'
-                                         for i, _ in enumerate(self.sketches)])
+                                         for i, _ in enumerate(self.sketch_files)])
 
         self.list_labels.addItems(self.get_sketch_labels())
 
     def connect_canvas(self):
-        self.graph_widgets['canvas']['sketch'].mpl_connect('button_press_event', self.sketch_click)
+        self.graph_widgets['canvas']['sketch'].scene().sigMouseClicked.connect(self.sketch_click)
 
     def connect_label_buttons(self, controls_cfg: dict):
         ll = self.list_labels
@@ -196,17 +210,18 @@ class SketchDock(QDockWidget):
         else:
             x, y = (np.nan, np.nan)
 
-        self.graph_widgets['highlight_dot']['sketch'].set_data([x], [y])
-        self.graph_widgets['highlight_circle']['sketch'].set_data([x], [y])
+        pos = np.empty((0, 2)) if np.any(np.isnan([x, y])) else np.array([[x, y]])
+        for view_key in self.VIEW_KEYS:
+            self.graph_widgets['highlight_dot'][view_key].setData(pos=pos)
+            self.graph_widgets['highlight_circle'][view_key].setData(pos=pos)
         # zoom
-        self.graph_widgets['highlight_dot']['sketch_zoom'].set_data([x], [y])
-        self.graph_widgets['highlight_circle']['sketch_zoom'].set_data([x], [y])
-        if not np.any(np.isnan([x, y])):
-            self.graph_widgets['axes']['sketch_zoom'].set_xlim([x - self.sketch_zoom_dx, x + self.sketch_zoom_dx])
-            self.graph_widgets['axes']['sketch_zoom'].set_ylim([y - self.sketch_zoom_dy, y + self.sketch_zoom_dy])
-        self.graph_widgets['axes']['sketch_zoom'].invert_yaxis()
+        if len(pos):
+            self.set_zoom_range(x, y)
 
-        self.graph_widgets['canvas']['sketch'].draw()
+    def set_zoom_range(self, x: float, y: float):
+        self.graph_widgets['views']['sketch_zoom'].setRange(xRange=(x - self.sketch_zoom_dx, x + self.sketch_zoom_dx),
+                                                            yRange=(y - self.sketch_zoom_dy, y + self.sketch_zoom_dy),
+                                                            padding=0)
 
     def set_sketch_zoom(self):
         sketch = self.get_sketch_image()
@@ -217,27 +232,26 @@ class SketchDock(QDockWidget):
         if not self.sketches_loaded:
             logger.log(logging.WARNING, "Attempted to get sketch image when no sketches are loaded")
             return None
-        return self.sketches[self.current_sketch_idx]['sketch'].astype(np.uint8)
+        return self.get_sketch()['sketch']
 
     def get_sketch_labels(self):
         if not self.sketches_loaded:
             logger.log(logging.WARNING, "Attempted to get sketch labels when no sketches are loaded")
             return None
-        return self.sketches[self.current_sketch_idx]['sketch_label_locations']
+        return self.get_sketch()['sketch_label_locations']
 
     def get_sketch_label_coordinates(self):
-        return np.array(list(self.get_sketch_labels().values()), dtype=np.float64)
+        return self.get_sketch()['sketch_label_coordinates']
 
     def sketch_click(self, event):
-        if event.button == 1:
-            x = event.xdata
-            y = event.ydata
-            if (x is not None) & (y is not None):
+        if event.button() == Qt.LeftButton:
+            for view in self.graph_widgets['views'].values():
+                if not view.sceneBoundingRect().contains(event.scenePos()):
+                    continue
+                point = view.mapSceneToView(event.scenePos())
+                x, y = point.x(), point.y()
                 label_coordinates = self.get_sketch_label_coordinates()
                 dists = ((x - label_coordinates[:, 0]) ** 2 + (y - label_coordinates[:, 1]) ** 2) ** 0.5
                 label_index = np.argmin(dists)
                 self.list_labels.setCurrentRow(label_index)
-
-    def clear_sketch(self):
-        for ax_key in ['sketch', 'sketch_zoom']:
-            self.graph_widgets['axes'][ax_key].clear()
+                return
@@ -2,9 +2,11 @@ import logging
 
 import numpy as np
 import pyqtgraph as pg
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QRectF, QTimer
 from PyQt5.QtWidgets import QApplication, QMdiSubWindow, QLabel, QSpinBox, QWidget, QVBoxLayout, QHBoxLayout, QCheckBox
 
+from labelgui.frame_cache import FrameCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,8 +35,13 @@ class ViewerSubWindow(QMdiSubWindow):
         'current_label': {'symbolBrush': 'darkgreen', 'symbolSize': 8},
         'error_line': {'color': 'red', 'width': 2}
     }
+    POINT_TYPES = ('label', 'guess_label', 'ref_label')
+    CURRENT_LABEL_TYPES = ('label', 'guess_label')
+    MIN_PYRAMID_SIZE = 64  # Smallest image side of a pyramid level
+    ROI_MARGIN = 0.5  # Margin around the view range of the full resolution region, relative to the view size
 
-    def __init__(self, index: int, reader, parent=None, img_item=None):
+    def __init__(self, index: int, reader, parent=None, img_item=None, frame_cache: FrameCache | None = None,
+                 display_pyramid=True, dtype: np.dtype | None = None):
 
         super().__init__(parent)
         # TODO: It will be ideal to have minimize and maximize buttons without close button
@@ -42,11 +49,19 @@ class ViewerSubWindow(QMdiSubWindow):
 
         self.index = index
         self.reader = reader
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache(reader)
         self.img_item = img_item
         self.rot_angle = 0.0  # Clockwise angle in degrees
         self.frame_idx = None
-        self.labels = {label_key: {} for label_key in self.plot_params}
+        self.frame = None  # Displayed frame, as cached by frame_cache
+        # Pyramid level and region (x0, y0, x1, y1) of the frame that is displayed, see update_display_image
+        self.display_pyramid = display_pyramid
+        self.display_level = 0
+        self.display_region = None
+        self.display_image = None
         self.current_label_name = None
+        self._clip_lut = None
+        self._clip_buffer = None
 
         main_widget = QWidget()
         main_layout = QVBoxLayout(main_widget)
@@ -56,7 +71,14 @@ class ViewerSubWindow(QMdiSubWindow):
         self.plot_wget.invertY(True)
         self.plot_wget.showAxes(False)  # whether to frame it with a full set of axes
         self.plot_wget.scene().sigMouseClicked.connect(self.mouse_clicked)
+        # View changes arrive in bursts while zooming or panning, the displayed region is updated once per burst
+        self.view_update_timer = QTimer(self)
+        self.view_update_timer.setSingleShot(True)
+        self.view_update_timer.timeout.connect(self.view_changed)
+        self.view_box.sigRangeChanged.connect(lambda *_: self.view_update_timer.start(0))
+        self.view_box.sigResized.connect(lambda *_: self.view_update_timer.start(0))
         main_layout.addWidget(self.plot_wget)
+        self.init_overlays()
 
         # Contrast options
         bottom_widget = QWidget()
@@ -83,7 +105,7 @@ class ViewerSubWindow(QMdiSubWindow):
         self.label_labeler = QLabel("")
         bottom_layout.addWidget(self.label_labeler)
 
-        self.set_intensity_range()
+        self.set_intensity_range(dtype)
         main_layout.addWidget(bottom_widget)
         self.setWidget(main_widget)
 
@@ -91,30 +113,142 @@ class ViewerSubWindow(QMdiSubWindow):
         if self.frame_idx is None:
             if self.img_item is not None:
                 self.img_item.clear()
+            self.frame = None
+            self.display_image = None
             return
 
-        img = self.reader.get_data(self.frame_idx).copy()
-        levels = [self.box_vmin.value(), self.box_vmax.value()]
-        img = np.clip(img, *levels)
-
-        adjust_level = self.checkbox_adjust_level.isChecked()
-        if not adjust_level:
-            levels = [self.box_vmin.minimum(), self.box_vmax.maximum()]
+        # The cached frame is displayed as is, the intensity range is applied by the image item
+        self.frame = self.frame_cache.get(self.frame_idx)
 
         if self.img_item is None:
-            self.img_item = pg.ImageItem(img, axisOrder='row-major', autoLevels=True)
+            self.img_item = pg.ImageItem(axisOrder='row-major')
             self.plot_wget.addItem(self.img_item)
             self.plot_wget.setAspectLocked(True)
 
-            img_y, img_x = img.shape[:2]  # np.rot90(img, k = self.rotate // 90).shape[:2]
-            max_size = max(img.shape[:2])
+            img_y, img_x = self.frame.shape[:2]  # np.rot90(img, k = self.rotate // 90).shape[:2]
+            max_size = max(self.frame.shape[:2])
             self.plot_wget.setLimits(xMin=(img_x - max_size) / 2,
                                      xMax=(img_x + max_size) / 2,
                                      yMin=(img_y - max_size) / 2,
                                      yMax=(img_y + max_size) / 2)
 
+        self.update_display_image()
+        self.update_levels(new_frame=True)
+
+    def get_display_region(self):
+        """
+        Pyramid level and frame region (x0, y0, x1, y1) to display at the current view range.
+
+        Zoomed out, this is the lowest resolution level that still has at least one image pixel per screen pixel.
+        Zoomed in, it is the visible part of the frame plus a margin at full resolution.
+        """
+        img_y, img_x = self.frame.shape[:2]
+        full_region = (0, 0, img_x, img_y)
+        if not self.display_pyramid:
+            return 0, full_region
+        # Subwindows that are hidden (e.g. in another tab) or not laid out yet have no meaningful view range, their
+        # view box is still at its default range of [0, 1]
+        if not self.isVisible() or self.view_box.width() <= 1 or self.view_box.height() <= 1:
+            return 0, full_region
+        try:
+            pixel_size = self.view_box.viewPixelSize()
+            (view_x0, view_x1), (view_y0, view_y1) = self.view_box.viewRange()
+        except Exception:
+            return 0, full_region
+        if pixel_size is None or not np.all(np.isfinite(pixel_size)) or \
+                (view_x0, view_x1, view_y0, view_y1) == (0, 1, 0, 1):
+            return 0, full_region
+
+        # Frame pixels per screen pixel
+        scale = min(pixel_size)
+        if scale >= 2:
+            level = int(np.log2(scale))
+            while level > 0 and min(img_x, img_y) / 2 ** level < self.MIN_PYRAMID_SIZE:
+                level -= 1
+            if level > 0:
+                return level, full_region
+
+        if self.display_level == 0 and self.display_region is not None:
+            x0, y0, x1, y1 = self.display_region
+            if x0 <= max(view_x0, 0) and y0 <= max(view_y0, 0) and x1 >= min(view_x1, img_x) and \
+                    y1 >= min(view_y1, img_y):
+                # The visible part is still covered by the displayed region
+                return 0, self.display_region
+
+        margin_x = (view_x1 - view_x0) * self.ROI_MARGIN
+        margin_y = (view_y1 - view_y0) * self.ROI_MARGIN
+        x0, x1 = int(max(0, np.floor(view_x0 - margin_x))), int(min(img_x, np.ceil(view_x1 + margin_x)))
+        y0, y1 = int(max(0, np.floor(view_y0 - margin_y))), int(min(img_y, np.ceil(view_y1 + margin_y)))
+        if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) > img_x * img_y / 2:
+            return 0, full_region
+        return 0, (x0, y0, x1, y1)
+
+    def update_display_image(self):
+        """Select the pyramid level or full resolution region of the frame to display"""
+        self.display_level, self.display_region = self.get_display_region()
+        if self.display_level > 0:
+            self.display_image = self.frame_cache.get_level(self.frame_idx, self.display_level)
+            step = 2 ** self.display_level
+            self.display_rect = QRectF(0, 0, self.display_image.shape[1] * step, self.display_image.shape[0] * step)
         else:
-            self.img_item.setImage(img, levels=levels)
+            x0, y0, x1, y1 = self.display_region
+            self.display_image = self.frame[y0:y1, x0:x1]
+            self.display_rect = QRectF(x0, y0, x1 - x0, y1 - y0)
+
+    def view_changed(self):
+        if self.frame is None or self.img_item is None:
+            return
+        if self.get_display_region() != (self.display_level, self.display_region):
+            self.update_display_image()
+            self.update_levels(new_frame=True)
+
+    def zoom_reset(self):
+        if self.frame is not None:
+            img_y, img_x = self.frame.shape[:2]
+            self.view_box.setRange(QRectF(0, 0, img_x, img_y))
+
+    def update_levels(self, new_frame=False):
+        """
+        Apply vmin/vmax to the displayed frame, without decoding it again.
+
+        With 'Adjust', vmin/vmax are the levels of the image item. Otherwise, the frame is clipped to vmin/vmax and
+        displayed over the full range of its dtype, which is a lookup table for monochrome frames. Lookup tables are
+        not applied to color frames, these are clipped into a reused buffer.
+        """
+        if self.img_item is None or self.display_image is None:
+            return
+
+        vmin, vmax = self.box_vmin.value(), self.box_vmax.value()
+        image = self.display_image
+        lut = None
+        if self.checkbox_adjust_level.isChecked():
+            levels = [vmin, vmax]
+        else:
+            levels = [self.box_vmin.minimum(), self.box_vmax.maximum()]
+            if self.frame.ndim == 2 or self.frame.shape[2] == 1:
+                lut = self.get_clip_lut(vmin, vmax)
+            else:
+                if self._clip_buffer is None or self._clip_buffer.shape != image.shape or \
+                        self._clip_buffer.dtype != image.dtype:
+                    self._clip_buffer = np.empty_like(image)
+                image = np.clip(image, vmin, vmax, out=self._clip_buffer)
+                new_frame = True
+
+        self.img_item.setLookupTable(lut, update=False)
+        if new_frame or image is not self.img_item.image:
+            self.img_item.setImage(image, levels=levels, autoLevels=False)
+            self.img_item.setRect(self.display_rect)
+        else:
+            self.img_item.setLevels(levels)
+
+    def get_clip_lut(self, vmin: int, vmax: int) -> np.ndarray:
+        """Lookup table over the full intensity range that clips to vmin/vmax"""
+        if self._clip_lut is None or self._clip_lut[0] != (vmin, vmax):
+            min_int, max_int = self.box_vmin.minimum(), self.box_vmax.maximum()
+            values = np.clip(np.arange(min_int, max_int + 1, dtype=np.float64), vmin, vmax)
+            lut = np.round((values - min_int) / (max_int - min_int) * 255).astype(np.uint8)
+            self._clip_lut = ((vmin, vmax), lut)
+        return self._clip_lut[1]
 
     def rotate_view(self, rot_angle: None | float = None):
         if rot_angle is not None:
@@ -124,12 +258,50 @@ class ViewerSubWindow(QMdiSubWindow):
         self.view_box.setTransformOriginPoint(local_center)
         self.view_box.setRotation(self.rot_angle)
 
+    def init_overlays(self):
+        """
+        Create one ScatterPlotItem per label type and a single item for all error lines.
+
+        Labels are assigned a fixed slot, shared by all label types, and their coordinates are kept in one array per
+        label type, with NaN marking labels that are not shown.
+        """
+        self.label_names = []
+        self.label_slots = {}
+        self.label_coords = {label_type: np.full((0, 2), np.nan) for label_type in self.POINT_TYPES}
+        self.label_coords['error_line'] = np.full((0, 2, 2), np.nan)
+        self.shown_slots = {label_type: np.zeros(0, dtype=int) for label_type in self.label_coords}
+        self.dirty_overlays = set()
+
+        self.overlay_items = {}
+        for label_type in self.POINT_TYPES:
+            params = self.plot_params[label_type]
+            item = pg.ScatterPlotItem(symbol=params['symbol'], size=params['symbolSize'],
+                                      brush=pg.mkBrush(params['symbolBrush']), pen=params['symbolPen'])
+            # The only way is to set this explicitly; all the point labels are set with a Z value of 10
+            item.setZValue(10)
+            self.plot_wget.addItem(item)
+            self.overlay_items[label_type] = item
+
+        self.overlay_items['error_line'] = pg.PlotDataItem(pen=pg.mkPen(**self.plot_params['error_line']),
+                                                           connect='pairs')
+        self.plot_wget.addItem(self.overlay_items['error_line'])
+
+    def get_label_slot(self, label_name: str):
+        slot = self.label_slots.get(label_name)
+        if slot is None:
+            slot = len(self.label_names)
+            self.label_names.append(label_name)
+            self.label_slots[label_name] = slot
+            for label_type, coords in self.label_coords.items():
+                self.label_coords[label_type] = np.concatenate((coords, np.full((1,) + coords.shape[1:], np.nan)))
+        return slot
+
     def draw_label(self, x: float, y: float, label_name: str, label_type='label', current_label=False):
         """
            Draw a label on the plot widget at the specified coordinates.
 
-           This method adds a label to the plot widget at the given (x, y) coordinates. If the label already exists,
-           it updates its position. Optionally, the label can be marked as the current label.
+           This sets the position of the label in the point array of its label type. The plot items are only
+           updated on the next call of update_overlays. Optionally, the label can be marked as the current label.
 
            Args:
                x (float): The x-coordinate of the label.
@@ -141,24 +313,69 @@ class ViewerSubWindow(QMdiSubWindow):
            Returns:
                None
         """
-        if label_name not in self.labels[label_type]:
-            label_params = self.plot_params[label_type].copy()
-            self.labels[label_type][label_name] = self.plot_wget.plot([x], [y], **label_params)
-            # The only way is to set this explicitly; all the point labels are set with a Z value of 10
-            self.labels[label_type][label_name].setZValue(10)
-        else:
-            self.labels[label_type][label_name].setData([x], [y])
+        slot = self.get_label_slot(label_name)
+        coords = self.label_coords[label_type]
+        if not (coords[slot, 0] == x and coords[slot, 1] == y):
+            coords[slot] = (x, y)
+            self.dirty_overlays.add(label_type)
 
-        if current_label:
+        if current_label and label_name != self.current_label_name:
             self.set_current_label(label_name)
 
+    def draw_labels(self, label_names, points: np.ndarray, label_type='label'):
+        """Set the positions of several labels at once, NaN points hide the respective label"""
+        slots = np.fromiter((self.get_label_slot(ln) for ln in label_names), dtype=int, count=len(label_names))
+        coords = self.label_coords[label_type]
+        points = np.asarray(points, dtype=np.float64).reshape(len(slots), 2)
+        if not np.array_equal(coords[slots], points, equal_nan=True):
+            coords[slots] = points
+            self.dirty_overlays.add(label_type)
+
     def draw_line(self, xs, ys, line_name: str, line_type='error_line'):
-        if line_name not in self.labels[line_type]:
-            line_params = self.plot_params[line_type].copy()
-            line_pen = pg.mkPen(**line_params)
-            self.labels[line_type][line_name] = self.plot_wget.plot(xs, ys, pen=line_pen)
+        slot = self.get_label_slot(line_name)
+        line = np.stack((xs, ys), axis=-1)
+        if not np.array_equal(self.label_coords[line_type][slot], line, equal_nan=True):
+            self.label_coords[line_type][slot] = line
+            self.dirty_overlays.add(line_type)
+
+    def hide_label(self, label_name: str, label_type='label'):
+        slot = self.label_slots.get(label_name)
+        if slot is not None and not np.isnan(self.label_coords[label_type][slot].flat[0]):
+            self.label_coords[label_type][slot] = np.nan
+            self.dirty_overlays.add(label_type)
+
+    def update_overlays(self):
+        """Push changed label arrays to their plot items, one setData per changed label type"""
+        for label_type in self.dirty_overlays:
+            coords = self.label_coords[label_type]
+            shown = np.flatnonzero(~np.isnan(coords.reshape(len(coords), -1)[:, 0]))
+            self.shown_slots[label_type] = shown
+
+            if label_type == 'error_line':
+                segments = coords[shown].reshape(-1, 2)
+                self.overlay_items[label_type].setData(segments[:, 0], segments[:, 1])
+            else:
+                self.overlay_items[label_type].setData(pos=coords[shown], data=shown)
+                self.update_label_style(label_type)
+        self.dirty_overlays.clear()
+
+    def update_label_style(self, label_type: str):
+        if label_type not in self.CURRENT_LABEL_TYPES:
+            return
+
+        params = self.plot_params[label_type]
+        current_params = self.plot_params['current_label']
+        current_slot = self.label_slots.get(self.current_label_name, -1)
+        is_current = self.shown_slots[label_type] == current_slot
+        item = self.overlay_items[label_type]
+        if np.any(is_current):
+            brushes = np.where(is_current, pg.mkBrush(current_params['symbolBrush']),
+                               pg.mkBrush(params['symbolBrush']))
+            item.setBrush(brushes.tolist(), update=False)
+            item.setSize(np.where(is_current, current_params['symbolSize'], params['symbolSize']))
         else:
-            self.labels[line_type][line_name].setData(xs, ys)
+            item.setBrush(pg.mkBrush(params['symbolBrush']), update=False)
+            item.setSize(params['symbolSize'])
 
     def set_current_label(self, label_name: str or None):
         """
@@ -166,24 +383,16 @@ class ViewerSubWindow(QMdiSubWindow):
         :param label_name: keyword
         :return: None
         """
-        for label_type in ['label', 'guess_label']:
-            # Change the status of the old 'current_label'
-            if self.current_label_name in self.labels[label_type]:
-                params = self.plot_params[label_type].copy()
-                self.labels[label_type][self.current_label_name].setSymbolBrush(params['symbolBrush'])
-                self.labels[label_type][self.current_label_name].setSymbolSize(params['symbolSize'])
-            # Set new 'current_label'
-            if label_name in self.labels[label_type]:
-                params = self.plot_params['current_label'].copy()
-                self.labels[label_type][label_name].setSymbolBrush(params['symbolBrush'])
-                self.labels[label_type][label_name].setSymbolSize(params['symbolSize'])
-
         self.current_label_name = label_name
+        self.update_overlays()
+        for label_type in self.CURRENT_LABEL_TYPES:
+            self.update_label_style(label_type)
 
     def get_labels(self, label_type: str = 'guess_label'):
         labels_out = {}
-        for label_name, label in self.labels[label_type].items():
-            labels_out[label_name] = label.getData()
+        coords = self.label_coords[label_type]
+        for slot in np.flatnonzero(~np.isnan(coords[:, 0])):
+            labels_out[self.label_names[slot]] = (coords[slot, [0]], coords[slot, [1]])
         return labels_out
 
     def mouse_clicked(self, event):
@@ -232,8 +441,9 @@ class ViewerSubWindow(QMdiSubWindow):
                                            self.frame_idx, self.index, action_str)
             logger.log(logging.DEBUG, f"Clicked on sub-window {self.index} at {mouse_point.x()}, {mouse_point.y()}")
 
-    def set_intensity_range(self):
-        img_dtype = self.reader.get_data(0).dtype
+    def set_intensity_range(self, img_dtype: np.dtype | None = None):
+        if img_dtype is None:
+            img_dtype = self.frame_cache.get(0).dtype
         min_int = np.iinfo(img_dtype).min
         max_int = np.iinfo(img_dtype).max
         self.box_vmin.setRange(min_int, max_int)
@@ -243,27 +453,24 @@ class ViewerSubWindow(QMdiSubWindow):
 
     def box_vmin_change(self, value: int):
         if value < self.box_vmax.value():
-            self.redraw_frame()
+            self.update_levels()
         else:
             self.box_vmin.setValue(self.box_vmax.value() - 1)
 
     def box_vmax_change(self, value: int):
         if value > self.box_vmin.value():
-            self.redraw_frame()
+            self.update_levels()
         else:
             self.box_vmax.setValue(self.box_vmin.value() + 1)
 
     def connect_controls(self):
         self.box_vmin.valueChanged.connect(self.box_vmin_change)
         self.box_vmax.valueChanged.connect(self.box_vmax_change)
-        self.checkbox_adjust_level.stateChanged.connect(self.redraw_frame)
-
-    def clear_label(self, label_name: str, label_type='label'):
-        # Remove the label from the dictionary and the view if it exists
-        label_item = self.labels[label_type].pop(label_name, None)
-        self.plot_wget.removeItem(label_item)
-
-    def clear_all_labels(self):
-        self.plot_wget.clearPlots()
-        self.labels = {label_key: {} for label_key in self.plot_params}
-        self.current_label_name = None
+        self.checkbox_adjust_level.stateChanged.connect(lambda _: self.update_levels())
+
+    def hide_all_labels(self):
+        for label_type, coords in self.label_coords.items():
+            if not np.all(np.isnan(coords)):
+                coords[:] = np.nan
+                self.dirty_overlays.add(label_type)
+        self.update_overlays()
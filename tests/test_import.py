@@ -0,0 +1,26 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from labelgui.benchmark import CLI_MODULE, GUI_MODULES, measure_import
+
+# Generous for loaded machines, the import takes about 200 ms locally
+IMPORT_BUDGET_MS = float(os.environ.get('LABELGUI_IMPORT_BUDGET_MS', 1000))
+
+
+@pytest.fixture(autouse=True)
+def repo_cwd(monkeypatch):
+    # The fresh interpreter imports labelgui from the working directory, also if it is not installed
+    monkeypatch.chdir(Path(__file__).parents[1])
+
+
+def test_cli_import_without_gui_stack():
+    _, modules = measure_import(CLI_MODULE)
+    assert not set(modules) & set(GUI_MODULES)
+
+
+def test_cli_import_time():
+    # Best of three, the first import may also be slowed down by cold file caches
+    import_ms = min(measure_import(CLI_MODULE)[0] for _ in range(3)) * 1000
+    assert import_ms <= IMPORT_BUDGET_MS
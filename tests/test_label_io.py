@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from labelgui import label_io
+from labelgui.label_store import LabelStore
+
+from test_label_store import assert_labels_equal, make_labels
+
+
+@pytest.fixture
+def labels_file(tmp_path):
+    return tmp_path / f"labels{label_io.BINARY_SUFFIX}"
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_binary_round_trip(labels_file, mmap):
+    labels = make_labels()
+    labels['labels']['nose'][0]['action'] = np.array([1, 0, 1])
+    label_io.save(labels_file, LabelStore.from_labels(labels))
+
+    # Written through a temporary file that is replaced
+    assert [file.name for file in labels_file.parent.iterdir()] == [labels_file.name]
+    store = label_io.load_binary(labels_file, mmap=mmap)
+    assert isinstance(store.chunks[0]['coords'], np.memmap) == mmap
+    assert_labels_equal(store.to_labels(), labels)
+    # Saving a loaded store writes the same file
+    copy_file = labels_file.with_name(f"copy{label_io.BINARY_SUFFIX}")
+    label_io.save(copy_file, store)
+    assert copy_file.read_bytes() == labels_file.read_bytes()
+
+
+def test_binary_round_trip_empty(labels_file):
+    label_io.save(labels_file, LabelStore(n_cams=2))
+    store = label_io.load(labels_file)
+
+    assert store.n_cams == 2
+    assert len(store) == 0 and not store.frame_idxs
+
+
+def test_binary_load_pads_n_cams(labels_file):
+    labels = make_labels(n_cams=1)
+    label_io.save(labels_file, labels)
+    store = label_io.load(labels_file, n_cams=2)
+
+    assert store.n_cams == 2
+    for fr_idx, entry in labels['labels']['nose'].items():
+        coords = store.get_coords('nose', fr_idx)
+        np.testing.assert_array_equal(coords[0], entry['coords'][0])
+        assert np.all(np.isnan(coords[1]))
+
+
+def test_editing_mapped_store_leaves_file_unchanged(labels_file):
+    labels = make_labels()
+    label_io.save(labels_file, labels)
+    file_bytes = labels_file.read_bytes()
+
+    store = label_io.load_binary(labels_file, mmap=True)
+    fr_idx = next(iter(labels['labels']['nose']))
+    store.set_point('nose', fr_idx, 0, [-1., -1.], point_time=1., labeler_idx=0)
+    store.delete_point('ear', next(iter(labels['labels']['ear'])), 1, point_time=1., labeler_idx=0)
+    store.set_point('paw', 10 ** 6, 0, [-1., -1.], point_time=1., labeler_idx=0)
+    for chunk in store.chunks:
+        for array in chunk.values():
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    assert labels_file.read_bytes() == file_bytes
+    np.testing.assert_array_equal(store.get_point('nose', fr_idx, 0), [-1., -1.])
+
+
+def test_save_over_mapped_file(labels_file):
+    labels = make_labels()
+    label_io.save(labels_file, labels)
+    store = label_io.load_binary(labels_file, mmap=True)
+
+    # The edited store is saved over the file it is mapped from
+    fr_idx = next(iter(labels['labels']['nose']))
+    store.set_point('nose', fr_idx, 0, [-1., -1.], point_time=1., labeler_idx=0)
+    expected = store.to_labels()
+    label_io.save(labels_file, store)
+
+    assert_labels_equal(label_io.load_binary(labels_file).to_labels(), expected)
+    # The store stays intact, its mapping still refers to the replaced file
+    assert_labels_equal(store.to_labels(), expected)
+
+
+def test_not_a_binary_file(labels_file):
+    labels_file.write_bytes(b"labels: {}\n")
+    with pytest.raises(ValueError):
+        label_io.load_binary(labels_file)
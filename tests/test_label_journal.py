@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from labelgui import label_io
+from labelgui.label_journal import LabelJournal
+from labelgui.label_store import LabelStore
+
+from test_label_store import assert_labels_equal
+
+
+@pytest.fixture
+def labels_file(tmp_path):
+    return tmp_path / "labels.yml"
+
+
+def edit(labels: LabelStore, journal: LabelJournal, label_name, frame_idx, cam_idx, coords, point_time,
+         labeler='alice'):
+    """Edit a point like the GUI does: in the store, then journaled"""
+    labeler_idx = labels.get_labeler_idx(labeler)
+    if coords is None:
+        labels.delete_point(label_name, frame_idx, cam_idx, point_time, labeler_idx)
+    else:
+        labels.set_point(label_name, frame_idx, cam_idx, coords, point_time, labeler_idx)
+    journal.append(LabelJournal.make_record(labels, label_name, frame_idx, cam_idx))
+
+
+def test_replay_after_restart(labels_file):
+    labels = LabelStore(n_cams=2)
+    journal = LabelJournal(labels_file)
+    edit(labels, journal, 'nose', 3, 0, [1., 2.], 10.)
+    edit(labels, journal, 'nose', 3, 1, [3., 4.], 11.)
+    edit(labels, journal, 'ear', 300, 1, [5., 6.], 12., labeler='bob')
+    edit(labels, journal, 'nose', 3, 0, None, 13.)
+    # No close: the session crashed
+
+    replayed = LabelStore(n_cams=2)
+    assert LabelJournal(labels_file).replay(replayed) == 4
+    assert_labels_equal(replayed.to_labels(), labels.to_labels())
+    assert replayed.get_point('nose', 3, 0) is None
+    assert replayed.get_point_time('nose', 3, 0) == 13.
+    assert replayed.labeler_list[replayed.get_frame(300, 'labeler')[1, 1]] == 'bob'
+
+
+def test_replay_is_idempotent(labels_file):
+    labels = LabelStore(n_cams=1)
+    journal = LabelJournal(labels_file)
+    edit(labels, journal, 'nose', 1, 0, [1., 2.], 10.)
+    journal.close()
+
+    replayed = LabelStore(n_cams=1)
+    LabelJournal(labels_file).replay(replayed)
+    LabelJournal(labels_file).replay(replayed)
+    assert_labels_equal(replayed.to_labels(), labels.to_labels())
+
+
+def test_replay_skips_incomplete_record(labels_file):
+    labels = LabelStore(n_cams=1)
+    journal = LabelJournal(labels_file)
+    edit(labels, journal, 'nose', 1, 0, [1., 2.], 10.)
+    journal.close()
+    with open(journal.journal_file, 'a') as fh:
+        fh.write('{"label": "nose", "fra')
+
+    replayed = LabelStore(n_cams=1)
+    assert LabelJournal(labels_file).replay(replayed) == 1
+    assert_labels_equal(replayed.to_labels(), labels.to_labels())
+
+
+def test_compact_after_save(labels_file):
+    labels = LabelStore(n_cams=1)
+    journal = LabelJournal(labels_file)
+    edit(labels, journal, 'nose', 1, 0, [1., 2.], 10.)
+
+    # Save: the journal is rotated, the labels are written, then the segment is compacted
+    segment = journal.rotate()
+    assert not journal.journal_file.exists()
+    assert journal.get_segment_files() == [journal.journal_file.with_name(f"{journal.journal_file.name}.{segment}")]
+    edit(labels, journal, 'nose', 2, 0, [3., 4.], 11.)
+    label_io.save(labels_file, labels.snapshot())
+    journal.compact(segment)
+    assert journal.get_segment_files() == []
+    journal.close()
+
+    # The next start loads the labels file and replays only the edit after the save
+    restarted = label_io.load(labels_file)
+    assert LabelJournal(labels_file).replay(restarted) == 1
+    assert_labels_equal(restarted.to_labels(), labels.to_labels())
+
+
+def test_segments_of_failed_saves_are_replayed(labels_file):
+    labels = LabelStore(n_cams=1)
+    journal = LabelJournal(labels_file)
+    edit(labels, journal, 'nose', 1, 0, [1., 2.], 10.)
+    first_segment = journal.rotate()
+    # The save failed, so the segment was not compacted
+    edit(labels, journal, 'nose', 1, 0, [5., 6.], 11.)
+    second_segment = journal.rotate()
+    edit(labels, journal, 'ear', 1, 0, [7., 8.], 12.)
+    journal.close()
+    assert second_segment == first_segment + 1
+
+    replayed = LabelStore(n_cams=1)
+    # Segments are replayed in order, before the active journal
+    assert LabelJournal(labels_file).replay(replayed) == 3
+    assert_labels_equal(replayed.to_labels(), labels.to_labels())
+
+    # A later successful save compacts all segments up to its own
+    journal = LabelJournal(labels_file)
+    journal.compact(journal.rotate())
+    assert journal.get_segment_files() == []
+    assert not journal.journal_file.exists()
+
+
+def test_apply_record_newer_only():
+    labels = LabelStore(n_cams=1)
+    labels.set_point('nose', 1, 0, [1., 2.], point_time=10., labeler_idx=labels.get_labeler_idx('alice'))
+    record = {'label': 'nose', 'frame': 1, 'cam': 0, 'coords': [3., 4.], 'point_time': 9., 'labeler': 'bob'}
+
+    # Older and equally old records lose
+    assert not LabelJournal.apply_record(labels, record, newer_only=True)
+    assert not LabelJournal.apply_record(labels, dict(record, point_time=10.), newer_only=True)
+    np.testing.assert_array_equal(labels.get_point('nose', 1, 0), [1., 2.])
+
+    assert LabelJournal.apply_record(labels, dict(record, point_time=11.), newer_only=True)
+    np.testing.assert_array_equal(labels.get_point('nose', 1, 0), [3., 4.])
+    assert 'bob' in labels.labeler_list
+    # Deletions are records without coordinates
+    assert LabelJournal.apply_record(labels, dict(record, coords=None, point_time=12.), newer_only=True)
+    assert labels.get_point('nose', 1, 0) is None
+    # Points without entry are always set, without newer_only records are always applied
+    assert LabelJournal.apply_record(labels, dict(record, frame=2), newer_only=True)
+    assert LabelJournal.apply_record(labels, dict(record, point_time=0.))
+    np.testing.assert_array_equal(labels.get_point('nose', 1, 0), [3., 4.])
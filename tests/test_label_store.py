@@ -0,0 +1,195 @@
+import numpy as np
+from bbo import label_lib
+
+from labelgui.label_store import LabelStore
+
+N_CAMS = 3
+
+
+def make_labels(n_frames=300, label_names=('nose', 'ear', 'tail'), n_cams=N_CAMS) -> dict:
+    """Labels in bbo.label_lib format, with gaps: not every label has an entry on every frame"""
+    rng = np.random.default_rng(0)
+    labels = label_lib.get_empty_labels()
+    labels['labeler_list'] += ['alice', 'bob']
+    for label_idx, label_name in enumerate(label_names):
+        label_dict = {}
+        for fr_idx in range(label_idx, n_frames * 2, 2 + label_idx):
+            coords = rng.uniform(0, 100, (n_cams, 2))
+            # Unlabeled cameras
+            coords[rng.random(n_cams) < 0.3] = np.nan
+            label_dict[fr_idx] = {
+                'coords': coords,
+                'point_times': rng.uniform(1e9, 2e9, n_cams),
+                'labeler': rng.integers(0, len(labels['labeler_list']), n_cams).astype(np.uint16),
+            }
+        labels['labels'][label_name] = label_dict
+    return labels
+
+
+def assert_labels_equal(labels, expected):
+    assert labels['version'] == expected['version']
+    assert labels['labeler_list'] == expected['labeler_list']
+    assert labels['action_list'] == expected['action_list']
+    assert labels['labels'].keys() == expected['labels'].keys()
+    for label_name, label_dict in expected['labels'].items():
+        assert sorted(labels['labels'][label_name]) == sorted(label_dict)
+        for fr_idx, entry in label_dict.items():
+            store_entry = labels['labels'][label_name][fr_idx]
+            assert store_entry.keys() == entry.keys()
+            for field, value in entry.items():
+                np.testing.assert_array_equal(store_entry[field], value)
+
+
+def test_round_trip():
+    labels = make_labels()
+    store = LabelStore.from_labels(labels)
+
+    assert store.n_cams == N_CAMS
+    # The frames span more than one chunk
+    assert len(store.chunks) > 1
+    assert store.generation == 0 and not store.dirty
+    assert_labels_equal(store.to_labels(), labels)
+
+
+def test_round_trip_extras():
+    labels = make_labels(n_frames=10)
+    entry = labels['labels']['nose'][0]
+    entry['action'] = np.array([1, 0, 1])
+    store = LabelStore.from_labels(labels)
+
+    assert_labels_equal(store.to_labels(), labels)
+    # Entries are copies
+    store.to_labels()['labels']['nose'][0]['coords'][:] = -1
+    assert_labels_equal(store.to_labels(), labels)
+
+
+def test_round_trip_empty():
+    labels = label_lib.get_empty_labels()
+    store = LabelStore.from_labels(labels, n_cams=2)
+
+    assert store.n_cams == 2
+    assert_labels_equal(store.to_labels(), labels)
+
+
+def test_from_labels_pads_n_cams():
+    labels = make_labels(n_frames=10, n_cams=1)
+    store = LabelStore.from_labels(labels, n_cams=2)
+
+    assert store.n_cams == 2
+    coords = store.get_coords('nose', 0)
+    np.testing.assert_array_equal(coords[0], labels['labels']['nose'][0]['coords'][0])
+    assert np.all(np.isnan(coords[1]))
+
+
+def test_set_and_delete_across_chunks():
+    store = LabelStore(n_cams=2)
+    labeler_idx = store.get_labeler_idx('alice')
+    n_frames = 2 * LabelStore.CHUNK_SIZE + 10
+    # Frames are assigned rows in the order of their first entry, not by frame index
+    frame_idxs = np.random.default_rng(1).permutation(n_frames) * 3
+
+    for fr_idx in frame_idxs:
+        store.set_point('nose', int(fr_idx), 0, [fr_idx, 1.], point_time=float(fr_idx), labeler_idx=labeler_idx)
+    # A label that is added later has to be grown into all chunks
+    for fr_idx in frame_idxs[::7]:
+        store.set_point('ear', int(fr_idx), 1, [2., fr_idx], point_time=1., labeler_idx=labeler_idx)
+
+    assert len(store.chunks) == 3
+    for fr_idx in frame_idxs:
+        np.testing.assert_array_equal(store.get_point('nose', int(fr_idx), 0), [fr_idx, 1.])
+        assert store.get_point('nose', int(fr_idx), 1) is None
+        assert store.get_point_time('nose', int(fr_idx), 0) == fr_idx
+    for row, fr_idx in enumerate(frame_idxs):
+        has_ear = row % 7 == 0
+        assert store.has_entry('ear', int(fr_idx)) == has_ear
+        if has_ear:
+            np.testing.assert_array_equal(store.get_frame_coords(int(fr_idx), 1)[1], [2., fr_idx])
+    np.testing.assert_array_equal(store.get_labeled_frame_idxs(), np.sort(frame_idxs))
+
+    # Deleting keeps the entry, with deletion time and labeler
+    last_fr_idx = int(frame_idxs[-1])
+    assert store.frame_rows[last_fr_idx] // LabelStore.CHUNK_SIZE == 2
+    assert store.delete_point('nose', last_fr_idx, 0, point_time=5., labeler_idx=labeler_idx)
+    assert not store.delete_point('nose', last_fr_idx, 0, point_time=6., labeler_idx=labeler_idx)
+    assert store.get_point('nose', last_fr_idx, 0) is None
+    assert store.has_entry('nose', last_fr_idx)
+    assert store.get_point_time('nose', last_fr_idx, 0) == 5.
+    # Neighbouring rows are untouched
+    np.testing.assert_array_equal(store.get_point('nose', int(frame_idxs[-2]), 0), [frame_idxs[-2], 1.])
+
+    labels = store.to_labels()
+    assert len(labels['labels']['nose']) == n_frames
+    assert np.all(np.isnan(labels['labels']['nose'][last_fr_idx]['coords'][0]))
+    assert_labels_equal(LabelStore.from_labels(labels).to_labels(), labels)
+
+
+def test_changes_are_tracked():
+    store = LabelStore(n_cams=1)
+    store.set_point('nose', 1, 0, [1., 1.], point_time=1., labeler_idx=0)
+    generation = store.generation
+    store.set_point('ear', 2, 0, [1., 1.], point_time=1., labeler_idx=0)
+
+    assert store.get_changes() == [('nose', 1), ('ear', 2)]
+    assert store.get_changes(generation) == [('ear', 2)]
+
+
+def test_widen_cams():
+    labels = make_labels(n_cams=2)
+    store = LabelStore.from_labels(labels)
+    store.widen_cams(4)
+
+    assert store.n_cams == 4
+    for label_name, label_dict in labels['labels'].items():
+        for fr_idx, entry in label_dict.items():
+            coords = store.get_coords(label_name, fr_idx)
+            assert coords.shape == (4, 2)
+            np.testing.assert_array_equal(coords[:2], entry['coords'])
+            assert np.all(np.isnan(coords[2:]))
+    # The new cameras can be labeled
+    store.set_point('nose', 0, 3, [5., 6.], point_time=1., labeler_idx=1)
+    np.testing.assert_array_equal(store.get_point('nose', 0, 3), [5., 6.])
+
+    # Narrower is a no-op
+    store.widen_cams(1)
+    assert store.n_cams == 4
+
+
+def test_snapshot_is_isolated_from_later_edits():
+    labels = make_labels()
+    store = LabelStore.from_labels(labels)
+    snapshot = store.snapshot()
+    fr_idx = max(labels['labels']['nose'])
+
+    # Edits of the store, in a shared chunk, in a new row and of a new label
+    store.set_point('nose', fr_idx, 0, [-1., -1.], point_time=1., labeler_idx=0)
+    store.delete_point('ear', min(labels['labels']['ear']), 0, point_time=1., labeler_idx=0)
+    store.set_point('nose', 10 ** 6, 0, [-1., -1.], point_time=1., labeler_idx=0)
+    store.set_point('paw', 0, 1, [-1., -1.], point_time=1., labeler_idx=0)
+    assert_labels_equal(snapshot.to_labels(), labels)
+
+    # A second snapshot shares the chunks that were copied for the first edits
+    second_snapshot = store.snapshot()
+    second_labels = store.to_labels()
+    store.set_point('nose', fr_idx, 1, [-2., -2.], point_time=2., labeler_idx=0)
+    assert_labels_equal(snapshot.to_labels(), labels)
+    assert_labels_equal(second_snapshot.to_labels(), second_labels)
+
+    # Edits of a snapshot do not reach the store either
+    store_labels = store.to_labels()
+    snapshot.set_point('nose', fr_idx, 2, [-3., -3.], point_time=3., labeler_idx=0)
+    assert_labels_equal(store.to_labels(), store_labels)
+
+
+def test_forget_changes():
+    store = LabelStore(n_cams=1)
+    for fr_idx in range(5):
+        store.set_point('nose', fr_idx, 0, [1., 1.], point_time=1., labeler_idx=0)
+    generation = store.generation
+    store.set_point('nose', 10, 0, [1., 1.], point_time=1., labeler_idx=0)
+    assert not store.snapshot().dirty
+
+    store.forget_changes(generation)
+    assert store.get_changes(generation) == [('nose', 10)]
+    assert len(store.dirty) == 1
+    store.forget_changes(0)
+    assert store.forgotten_generation == generation
@@ -0,0 +1,169 @@
+import pytest
+
+from labelgui.sync import InProcessBroker, LabelSync, MqttConnection, TimeSync
+
+TOPIC = "bbo/sync/time"
+
+
+@pytest.fixture
+def broker():
+    return InProcessBroker()
+
+
+def make_connection(broker):
+    connection = MqttConnection(client=broker.client())
+    connection.connect()
+    return connection
+
+
+class FakeClock:
+    """Clock and timers of TimeSync, timers fire when the clock is advanced past their due time"""
+
+    def __init__(self):
+        self.now = 0.
+        self.timers = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def timer(self, interval: float, function):
+        clock = self
+
+        class Timer:
+            daemon = False
+
+            def start(self):
+                clock.timers.append((clock.now + interval, self))
+
+            def cancel(self):
+                clock.timers = [(due, timer) for due, timer in clock.timers if timer is not self]
+
+            def fire(self):
+                function()
+
+        return Timer()
+
+    def advance(self, seconds: float):
+        self.now += seconds
+        due_timers = [timer for due, timer in self.timers if due <= self.now]
+        self.timers = [(due, timer) for due, timer in self.timers if due > self.now]
+        for timer in due_timers:
+            timer.fire()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_time_sync(broker, clock, max_rate=10, on_time=lambda: None):
+    return TimeSync(make_connection(broker), TOPIC, on_time=on_time, max_rate=max_rate, clock=clock,
+                    timer_class=clock.timer)
+
+
+def make_listener(broker, topic=TOPIC):
+    """Raw subscriber that records all payloads on topic"""
+    received = []
+    make_connection(broker).subscribe(topic, lambda payload, user_properties: received.append(float(payload)))
+    return received
+
+
+def test_rate_limit_with_trailing_edge(broker, clock):
+    received = make_listener(broker)
+    sender = make_time_sync(broker, clock, max_rate=10)
+
+    for t in range(5):
+        sender.publish(float(t))
+        clock.advance(0.01)
+    # The first time goes out immediately, the others wait for the end of the interval
+    assert received == [0.]
+    assert len(clock.timers) == 1
+
+    clock.advance(0.06)
+    # Only the last time of the interval is published, at its end
+    assert received == [0., 4.]
+    assert not clock.timers
+
+    # The trailing publish starts the next interval
+    sender.publish(5.)
+    assert received == [0., 4.]
+    clock.advance(0.11)
+    assert received == [0., 4., 5.]
+    sender.close()
+
+
+def test_publish_after_interval_is_immediate(broker, clock):
+    received = make_listener(broker)
+    sender = make_time_sync(broker, clock, max_rate=10)
+
+    sender.publish(1.)
+    clock.advance(0.1)
+    sender.publish(2.)
+    assert received == [1., 2.]
+    assert not clock.timers
+
+
+def test_close_cancels_trailing_publish(broker, clock):
+    received = make_listener(broker)
+    sender = make_time_sync(broker, clock, max_rate=10)
+
+    sender.publish(1.)
+    sender.publish(2.)
+    sender.close()
+    clock.advance(1)
+    assert received == [1.]
+
+
+def test_receive_keeps_newest_and_notifies_once(broker):
+    notifications = []
+    receiver = TimeSync(make_connection(broker), TOPIC, on_time=lambda: notifications.append(1), max_rate=0)
+    sender = TimeSync(make_connection(broker), TOPIC, on_time=lambda: None, max_rate=0)
+
+    sender.publish(1.)
+    sender.publish(2.)
+    assert len(notifications) == 1
+    assert receiver.take_pending() == 2.
+    assert receiver.take_pending() is None
+
+
+def test_own_messages_are_not_received(broker):
+    notifications = []
+    sync = TimeSync(make_connection(broker), TOPIC, on_time=lambda: notifications.append(1), max_rate=0)
+
+    sync.publish(1.)
+    assert not notifications
+    assert sync.take_pending() is None
+
+
+def test_out_of_order_messages_are_dropped(broker):
+    receiver = TimeSync(make_connection(broker), TOPIC, on_time=lambda: None, max_rate=0)
+    connection = make_connection(broker)
+
+    connection.publish(TOPIC, "2.0", seq=2, sender="peer")
+    assert receiver.take_pending() == 2.
+    connection.publish(TOPIC, "1.0", seq=1, sender="peer")
+    assert receiver.take_pending() is None
+    # Sequence numbers are tracked per sender
+    connection.publish(TOPIC, "3.0", seq=1, sender="other_peer")
+    assert receiver.take_pending() == 3.
+    # Messages without sequence number are always accepted
+    connection.publish(TOPIC, "4.0")
+    assert receiver.take_pending() == 4.
+
+
+def test_invalid_time_is_ignored(broker):
+    receiver = TimeSync(make_connection(broker), TOPIC, on_time=lambda: None, max_rate=0)
+    make_connection(broker).publish(TOPIC, "not a time", seq=1, sender="peer")
+    assert receiver.take_pending() is None
+
+
+def test_label_records(broker):
+    topic = "bbo/sync/labels"
+    receiver = LabelSync(make_connection(broker), topic, on_records=lambda: None)
+    sender = LabelSync(make_connection(broker), topic, on_records=lambda: None)
+
+    record = {'label': 'nose', 'frame': 3, 'cam': 1, 'coords': [1., 2.], 'point_time': 10., 'labeler': 'user'}
+    sender.publish(record)
+    sender.publish(dict(record, coords=None))
+    assert receiver.take_pending() == [record, dict(record, coords=None)]
+    assert sender.take_pending() == []